@@ -2,6 +2,7 @@
 Django settings for core project.
 """
 
+from datetime import timedelta
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -59,6 +60,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     # Auditoria
     'simple_history.middleware.HistoryRequestMiddleware',    
+    'inventory.middleware.BatchedHistoryMiddleware',
 ]
 
 ROOT_URLCONF = "core.urls"
@@ -187,4 +189,47 @@ CACHES = {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         },
     }
-}
\ No newline at end of file
+}
+
+# 5. Idempotência das movimentações (cabeçalho Idempotency-Key)
+# -----------------------------------------
+# Por quanto tempo uma chave é lembrada e o máximo de chaves guardadas.
+# Cada lançamento remove as chaves expiradas do próprio usuário; as demais
+# (e as excedentes) são removidas pelo comando purge_idempotency_keys, que
+# deve ser agendado (ex: cron a cada hora).
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+IDEMPOTENCY_KEY_MAX_ENTRIES = 100_000
+
+# 6. Resolução de códigos por scanner (/api/items/resolve/<código>/)
+# -----------------------------------------
+# Tempo máximo (segundos) de uma resolução no cache; gravar o item invalida antes.
+ITEM_CODE_CACHE_TIMEOUT = 60 * 60
+
+# 7. Retenção do histórico (simple_history) - comando prune_history
+# -----------------------------------------
+# Por modelo: dias de histórico completo mantidos no banco e o destino dos
+# registros mais antigos: 'archive' (gravados em HISTORY_ARCHIVE_ROOT como
+# JSON Lines comprimido e apagados) ou 'drop' (apenas apagados). Modelos
+# fora da lista mantêm todo o histórico.
+HISTORY_RETENTION = {
+    # Cada alteração de saldo já está no extrato (StockMovement)
+    'StockItem': {'days': 90, 'action': 'drop'},
+    'StockMovement': {'days': 365, 'action': 'archive'},
+    'Item': {'days': 365, 'action': 'archive'},
+}
+HISTORY_ARCHIVE_ROOT = BASE_DIR / 'history_archive'
+
+# 8. Gravação enxuta de movimentações
+# -----------------------------------------
+# Com True, movimentações novas não gravam HistoricalStockMovement: o extrato
+# não é editado e já guarda usuário e data, e o feed de atividades recebe a
+# entrada direto da movimentação. Os saldos (StockItem) nunca gravam histórico
+# ao serem movimentados. Compare com o comando bench_movement_writes.
+STOCK_LEAN_POSTING = False
+
+# 9. Gravação do histórico em lote
+# -----------------------------------------
+# Com True, os registros de histórico de cada request são acumulados e
+# gravados com um bulk_create por modelo ao final (BatchedHistoryMiddleware),
+# em vez de um INSERT por save(). Só os de transações confirmadas são gravados.
+HISTORY_BATCH_WRITES = False
@@ -4,11 +4,12 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 from solo.admin import SingletonModelAdmin  # type: ignore
 
+from .history import batched_history
 # Importamos apenas os modelos do NOSSO app 'inventory'
 from .models import (
     Branch, CategoryGroup, Sector, UserProfile,
     Supplier, Category, Item, Location, 
-    StockItem, StockMovement, MovementType, SystemSettings 
+    StockItem, StockMovement, MovementType, SystemSettings, StockClosing
 )
 
 
@@ -44,13 +45,16 @@ class BaseModelAdmin(admin.ModelAdmin):
 
     @admin.action(description='Restaurar selecionados')
     def restore_selected(self, request, queryset):
-        for obj in queryset:
-            obj.restore()
+        # Um bulk_create do histórico para toda a seleção
+        with batched_history():
+            for obj in queryset:
+                obj.restore()
 
     @admin.action(description='Deletar (arquivar) selecionados')
     def soft_delete_selected(self, request, queryset):
-        for obj in queryset:
-            obj.delete()
+        with batched_history():
+            for obj in queryset:
+                obj.delete()
 
 # --- ADMINS CUSTOMIZADOS ---
 
@@ -155,6 +159,16 @@ class StockItemAdmin(admin.ModelAdmin):
     autocomplete_fields = ['item', 'location']
     readonly_fields = ('quantity',)
 
+@admin.register(StockClosing)
+class StockClosingAdmin(admin.ModelAdmin):
+    """Fechamentos são gerados pelo comando close_stock_period; aqui são apenas consultados."""
+    list_display = ('period', 'created_at', 'created_by')
+    date_hierarchy = 'period'
+    readonly_fields = ('period', 'created_at', 'created_by')
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(SystemSettings)
 class SystemSettingsAdmin(SingletonModelAdmin):
     fieldsets = (
@@ -0,0 +1,99 @@
+# backend/inventory/exports.py
+"""
+Geração linha a linha dos arquivos de exportação (CSV e NDJSON). As funções
+devolvem geradores de texto, consumidos tanto pelas views (StreamingHttpResponse)
+quanto pelos comandos de gerenciamento (gravação em arquivo).
+"""
+import csv
+import json
+
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from rest_framework.utils.encoders import JSONEncoder
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+class EchoBuffer:
+    """Arquivo falso para csv.writer: devolve a linha formatada em vez de gravá-la."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    """Cabeçalho e uma linha de CSV por dict de `rows` (nas colunas de `header`)."""
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row[column] for column in header)
+
+
+def ndjson_lines(rows):
+    """Um objeto JSON por linha para cada dict de `rows`."""
+    for row in rows:
+        yield json.dumps(row, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_lines(export_format, header, rows):
+    return csv_lines(header, rows) if export_format == 'csv' else ndjson_lines(rows)
+
+
+CATALOG_COLUMNS = [
+    'sku', 'ean', 'name', 'category', 'supplier', 'status', 'unit_of_measure',
+    'purchase_price', 'sale_price', 'total_quantity',
+]
+
+
+def branch_stock_column(branch):
+    """
+    Coluna de saldo de uma filial no catálogo. Usa o id, e não o nome: nomes
+    podem repetir entre filiais ou coincidir com uma coluna do item.
+    """
+    return f'stock:{branch.pk}'
+
+
+def catalog_header(branches):
+    """Colunas do catálogo: dados do item e uma coluna de saldo por filial (branch_stock_column)."""
+    return CATALOG_COLUMNS + [branch_stock_column(branch) for branch in branches]
+
+
+def catalog_rows(items, branches, chunk_size=2000):
+    """
+    Linhas do catálogo para o queryset `items`, com o saldo em cada filial de
+    `branches`. Os saldos por filial vêm de uma única consulta agrupada por
+    item (SUM condicional sobre StockItem, uma coluna por filial), lida com
+    iterator(): nada é consultado por linha.
+    """
+    branch_totals = {
+        f'branch_{index}': Coalesce(
+            Sum(
+                'stock_items__quantity',
+                filter=Q(stock_items__location__branch_id=branch.pk, stock_items__deleted_at__isnull=True)
+            ),
+            0
+        )
+        for index, branch in enumerate(branches)
+    }
+    rows = (
+        items.order_by('sku')
+        .values(
+            'sku', 'ean', 'name', 'status', 'unit_of_measure', 'purchase_price', 'sale_price', 'total_quantity',
+            category_name=F('category__name'), supplier_name=F('supplier__name'),
+        )
+        .annotate(**branch_totals)
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'sku': row['sku'],
+            'ean': row['ean'] or '',
+            'name': row['name'],
+            'category': row['category_name'] or '',
+            'supplier': row['supplier_name'] or '',
+            'status': row['status'],
+            'unit_of_measure': row['unit_of_measure'],
+            'purchase_price': row['purchase_price'],
+            'sale_price': row['sale_price'],
+            'total_quantity': row['total_quantity'],
+            **{branch_stock_column(branch): row[f'branch_{index}'] for index, branch in enumerate(branches)},
+        }
@@ -0,0 +1,439 @@
+# backend/inventory/history.py
+"""
+Manutenção das tabelas de histórico (simple_history). A política de
+retenção (settings.HISTORY_RETENTION) define, por modelo, quantos dias de
+histórico completo ficam no banco; os registros mais antigos são apagados
+ou, antes disso, arquivados em disco como JSON Lines comprimido com gzip.
+
+A limpeza anda em blocos pela chave do histórico, cada um na sua própria
+transação curta, para não segurar travas nas tabelas enquanto roda.
+
+Também define a gravação em lote do histórico: dentro de batched_history()
+(ou de um request com HISTORY_BATCH_WRITES), os registros de histórico são
+acumulados e gravados com um bulk_create por modelo ao final, em vez de um
+INSERT por save().
+
+Modelos com HISTORY_DELTA_KEEP_FIELDS (ex: Item) têm histórico em delta:
+cada alteração grava apenas os campos que mudaram (mais os campos
+mantidos), e os registros completos são reconstruídos na leitura a partir
+dos anteriores (ver DeltaHistory).
+"""
+import gzip
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+from pathlib import Path
+
+from asgiref.local import Local
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+from simple_history.signals import pre_create_historical_record
+
+RETENTION_ACTIONS = ('drop', 'archive')
+
+
+def retention_policies(models=None):
+    """
+    Lê settings.HISTORY_RETENTION e devolve [(modelo, dias, ação)], opcionalmente
+    só para os nomes em `models`.
+    """
+    config = getattr(settings, 'HISTORY_RETENTION', {})
+    unknown = set(models or ()) - set(config)
+    if unknown:
+        raise ImproperlyConfigured(f"Sem política de retenção para: {', '.join(sorted(unknown))}.")
+
+    policies = []
+    for model_name, policy in config.items():
+        if models and model_name not in models:
+            continue
+        try:
+            model = apps.get_model('inventory', model_name)
+        except LookupError:
+            raise ImproperlyConfigured(f"HISTORY_RETENTION: modelo desconhecido '{model_name}'.")
+        if not hasattr(model, 'history'):
+            raise ImproperlyConfigured(f"HISTORY_RETENTION: '{model_name}' não tem histórico.")
+        days, action = policy.get('days'), policy.get('action', 'drop')
+        if not isinstance(days, int) or days < 0 or action not in RETENTION_ACTIONS:
+            raise ImproperlyConfigured(
+                f"HISTORY_RETENTION['{model_name}'] deve ter 'days' >= 0 e 'action' em {RETENTION_ACTIONS}."
+            )
+        policies.append((model, days, action))
+    return policies
+
+
+class HistoryPruner:
+    """
+    Aplica a retenção ao histórico de um modelo: os registros anteriores a
+    `days` dias são apagados em blocos de `batch_size`; com a ação 'archive',
+    cada bloco é antes acrescentado ao arquivo
+    <archive_root>/<modelo>/<modelo>-<data da execução>.jsonl.gz.
+    """
+    def __init__(self, model, days, action, archive_root=None, batch_size=1000, now=None):
+        self.model = model
+        self.history_model = model.history.model
+        self.action = action
+        self.batch_size = batch_size
+        self.now = now or timezone.now()
+        self.cutoff = self.now - timedelta(days=days)
+        self.archive_root = Path(archive_root or settings.HISTORY_ARCHIVE_ROOT)
+
+    def expired(self):
+        return self.history_model.objects.filter(history_date__lt=self.cutoff)
+
+    @property
+    def archive_path(self):
+        name = self.model._meta.model_name
+        return self.archive_root / name / f"{name}-{self.now:%Y%m%d%H%M%S}.jsonl.gz"
+
+    def run(self):
+        """Processa todos os blocos vencidos. Retorna quantos registros saíram do banco."""
+        removed = 0
+        while True:
+            ids = list(
+                self.expired().order_by('history_id').values_list('history_id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return removed
+            removed += self._prune_chunk(ids)
+
+    def _prune_chunk(self, ids):
+        with transaction.atomic():
+            rows = self.history_model.objects.filter(history_id__in=ids)
+            delta = DeltaHistory.for_model(self.model)
+            if delta is not None:
+                # O registro que passa a ser o mais antigo não pode depender dos apagados
+                delta.materialize_successors(rows)
+            if self.action == 'archive':
+                # Um membro gzip por bloco, fechado antes do commit: se a gravação
+                # falhar, o bloco continua no banco
+                self._archive(rows.order_by('history_id').values())
+            deleted, _ = rows.delete()
+        return deleted
+
+    def _archive(self, rows):
+        path = self.archive_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+
+
+class DeltaHistory:
+    """
+    Histórico em delta de um modelo com HISTORY_DELTA_KEEP_FIELDS. Os
+    registros de alteração ('~') guardam em `history_changed_fields` a lista
+    dos campos gravados; os demais ficam vazios e valem o mesmo que no
+    registro anterior. Registros de criação e exclusão, os gravados antes do
+    modo delta (lista vazia no banco) e um a cada MAX_CHAIN são completos.
+    """
+    CHANGED_FIELDS = 'history_changed_fields'
+    # Registros seguidos em delta antes de gravar de novo um registro completo,
+    # para limitar quantas linhas a reconstrução precisa ler
+    MAX_CHAIN = 20
+
+    _instances = {}
+
+    def __init__(self, model):
+        self.model = model
+        self.history_model = model.history.model
+        self.pk_name = model._meta.pk.attname
+        keep = set(model.HISTORY_DELTA_KEEP_FIELDS)
+        self._history_fields = {
+            field.attname: field for field in self.history_model._meta.concrete_fields
+        }
+        self.fields = [
+            field.attname for field in self.history_model.tracked_fields
+            if field.name not in keep and field.attname not in keep
+        ]
+
+    @classmethod
+    def for_model(cls, model):
+        """DeltaHistory do modelo, ou None se ele guarda o histórico completo."""
+        if getattr(model, 'HISTORY_DELTA_KEEP_FIELDS', None) is None:
+            return None
+        if model not in cls._instances:
+            cls._instances[model] = cls(model)
+        return cls._instances[model]
+
+    def snapshot(self, pk, until=None):
+        """
+        Valores completos dos campos em delta no registro mais recente do
+        objeto (ou no registro `until`), lendo para trás só até preencher
+        todos. Retorna (valores ou None se não houver histórico, linhas lidas).
+        """
+        history = self.history_model.objects.filter(**{self.pk_name: pk})
+        if until is not None:
+            history = history.filter(
+                Q(history_date__lt=until.history_date)
+                | Q(history_date=until.history_date, history_id__lte=until.history_id)
+            )
+        rows = history.order_by('-history_date', '-history_id').values(*self.fields, self.CHANGED_FIELDS)
+        values, missing, depth = {}, set(self.fields), 0
+        for row in rows.iterator(chunk_size=self.MAX_CHAIN):
+            depth += 1
+            changed = row[self.CHANGED_FIELDS]
+            found = missing if changed is None else missing.intersection(changed)
+            values.update((field, row[field]) for field in found)
+            missing -= found
+            if not missing:
+                break
+        return (values if depth else None), depth
+
+    def fill(self, history_instance):
+        """Completa em memória os campos não gravados de um registro em delta."""
+        changed = getattr(history_instance, self.CHANGED_FIELDS)
+        if changed is not None and not getattr(history_instance, '_delta_filled', False):
+            values, _ = self.snapshot(getattr(history_instance, self.pk_name), until=history_instance)
+            for field in self.fields:
+                if field not in changed:
+                    setattr(history_instance, field, (values or {}).get(field))
+            history_instance._delta_filled = True
+        return history_instance
+
+    def as_of(self, pk, when):
+        """
+        Registro de histórico vigente em `when` (o último até essa data), com
+        os campos em delta preenchidos, ou None se o objeto ainda não existia
+        ou já tinha sido excluído. As duas leituras usam o índice
+        (id, history_date) do histórico.
+        """
+        record = self.history_model.objects.filter(
+            **{self.pk_name: pk}, history_date__lte=when
+        ).order_by('-history_date', '-history_id').first()
+        if record is None or record.history_type == '-':
+            return None
+        return self.fill(record)
+
+    def as_of_many(self, pks, when):
+        """
+        Como as_of() para vários objetos, com uma única consulta: lê, por
+        objeto, os registros desde o último completo até `when`, em ordem
+        (id, history_date), e aplica os deltas em memória. Retorna
+        {pk: registro} só dos objetos existentes na data.
+        """
+        last_full = self.history_model.objects.filter(
+            **{self.pk_name: OuterRef(self.pk_name)},
+            history_date__lte=when, **{f'{self.CHANGED_FIELDS}__isnull': True}
+        ).order_by('-history_date', '-history_id').values('history_date')[:1]
+        rows = self.history_model.objects.filter(
+            **{f'{self.pk_name}__in': pks}, history_date__lte=when, history_date__gte=Subquery(last_full)
+        ).order_by(self.pk_name, 'history_date', 'history_id')
+
+        records, values = {}, {}
+        for row in rows:
+            pk = getattr(row, self.pk_name)
+            changed = getattr(row, self.CHANGED_FIELDS)
+            current = values.setdefault(pk, {})
+            current.update((field, getattr(row, field)) for field in (self.fields if changed is None else changed))
+            records[pk] = row
+        for pk, record in list(records.items()):
+            if record.history_type == '-':
+                del records[pk]
+                continue
+            for field, value in values[pk].items():
+                setattr(record, field, value)
+            record._delta_filled = True
+        return records
+
+    def compact(self, history_instance, previous, depth):
+        """
+        Esvazia os campos iguais aos de `previous` (valores completos do
+        registro anterior, que está a `depth` registros de um completo).
+        Retorna (valores completos deste registro, profundidade dele).
+        """
+        # Valores como vão para o banco (ex: FieldFile vira o nome do arquivo)
+        current = {
+            field: self._history_fields[field].get_prep_value(getattr(history_instance, field))
+            for field in self.fields
+        }
+        if previous is None or history_instance.history_type != '~' or depth >= self.MAX_CHAIN:
+            return current, 1
+        changed = [field for field in self.fields if current[field] != previous.get(field)]
+        for field in self.fields:
+            if field not in changed:
+                setattr(history_instance, field, None)
+        setattr(history_instance, self.CHANGED_FIELDS, changed)
+        return current, depth + 1
+
+    def compact_against_database(self, history_instance):
+        """Compacta um registro prestes a ser gravado em relação ao último do banco."""
+        previous, depth = self.snapshot(getattr(history_instance, self.pk_name))
+        self.compact(history_instance, previous, depth)
+
+    def compact_batch(self, history_instances):
+        """Compacta registros ainda não gravados, em ordem, cada um em relação ao anterior do mesmo objeto."""
+        chains = {}
+        for history_instance in sorted(history_instances, key=lambda row: row.history_date):
+            pk = getattr(history_instance, self.pk_name)
+            if pk not in chains:
+                chains[pk] = self.snapshot(pk)
+            chains[pk] = self.compact(history_instance, *chains[pk])
+
+    def materialize_successors(self, rows):
+        """
+        Torna completo, para cada objeto de `rows`, o primeiro registro que
+        vem depois deles, antes que `rows` sejam apagados.
+        """
+        last_rows = {}
+        for row in rows.order_by('history_date', 'history_id').values(self.pk_name, 'history_date', 'history_id'):
+            last_rows[row[self.pk_name]] = row
+        for pk, last in last_rows.items():
+            successor = self.history_model.objects.filter(**{self.pk_name: pk}).filter(
+                Q(history_date__gt=last['history_date'])
+                | Q(history_date=last['history_date'], history_id__gt=last['history_id'])
+            ).order_by('history_date', 'history_id').first()
+            if successor is None or getattr(successor, self.CHANGED_FIELDS) is None:
+                continue
+            values, _ = self.snapshot(pk, until=successor)
+            self.history_model.objects.filter(history_id=successor.history_id).update(
+                **{self.CHANGED_FIELDS: None, **(values or {})}
+            )
+
+
+_local = Local()
+
+
+class HistoryBuffer:
+    """
+    Registros de histórico aguardando gravação. Cada registro só entra na
+    fila quando a transação que alterou o objeto é confirmada (on_commit):
+    os de um savepoint ou transação desfeitos são descartados junto com a
+    alteração, e os já confirmados não se perdem se algo falhar depois.
+    """
+    def __init__(self):
+        self.pending = defaultdict(list)
+
+    def add(self, history_instance, using=None):
+        transaction.on_commit(partial(self._keep, history_instance), using=using)
+
+    def _keep(self, history_instance):
+        self.pending[type(history_instance)].append(history_instance)
+
+    def flush(self, batch_size=1000):
+        """
+        Grava a fila com um bulk_create por modelo de histórico e registra as
+        atividades no feed (o bulk_create não dispara post_create_historical_record).
+        """
+        from .models import ActivityFeedEntry
+
+        pending, self.pending = self.pending, defaultdict(list)
+        with transaction.atomic():
+            for history_model, rows in pending.items():
+                delta = DeltaHistory.for_model(history_model.instance_type)
+                if delta is not None:
+                    delta.compact_batch(rows)
+                created = history_model.objects.bulk_create(rows, batch_size=batch_size)
+                ActivityFeedEntry.objects.add_history(created)
+
+
+def current_history_buffer():
+    return getattr(_local, 'buffer', None)
+
+
+@contextmanager
+def batched_history():
+    """
+    Acumula os registros de histórico gravados dentro do bloco e os grava
+    em lote na saída, mesmo que o bloco termine com erro (apenas o que foi
+    confirmado no banco); dentro de uma transação, quando ela for confirmada.
+    Blocos aninhados usam o buffer do mais externo.
+    """
+    if current_history_buffer() is not None:
+        yield current_history_buffer()
+        return
+    buffer = _local.buffer = HistoryBuffer()
+    try:
+        yield buffer
+    finally:
+        del _local.buffer
+        if transaction.get_connection().in_atomic_block:
+            # Dentro de uma transação maior: grava depois dos registros dela
+            transaction.on_commit(buffer.flush)
+        else:
+            buffer.flush()
+
+
+class BufferedHistoricalRecords(HistoricalRecords):
+    """
+    HistoricalRecords que, dentro de batched_history(), põe o registro no
+    buffer em vez de gravá-lo. Usuário, data e motivo da alteração são
+    resolvidos na hora do save(), como no HistoricalRecords.
+
+    Nos modelos com HISTORY_DELTA_KEEP_FIELDS, o modelo histórico aceita
+    vazio nos campos em delta, ganha `history_changed_fields` e o
+    `.instance` de cada registro vem reconstruído (ver DeltaHistory).
+    """
+    def copy_fields(self, model):
+        fields = super().copy_fields(model)
+        keep = getattr(model, 'HISTORY_DELTA_KEEP_FIELDS', None)
+        if keep is not None:
+            for name, field in fields.items():
+                if name not in keep:
+                    field.null = field.blank = True
+        return fields
+
+    def get_meta_options(self, model):
+        meta_fields = super().get_meta_options(model)
+        # Consultas de um objeto em uma data (as_of, histórico em delta) andam
+        # por (id, history_date) em ordem decrescente
+        meta_fields['indexes'] = (
+            *meta_fields.get('indexes', ()),
+            models.Index(fields=[model._meta.pk.attname, 'history_date', 'history_id']),
+        )
+        return meta_fields
+
+    def get_extra_fields(self, model, fields):
+        extra_fields = super().get_extra_fields(model, fields)
+        if getattr(model, 'HISTORY_DELTA_KEEP_FIELDS', None) is not None:
+            extra_fields[DeltaHistory.CHANGED_FIELDS] = models.JSONField(
+                null=True, blank=True, editable=False,
+                help_text="Campos gravados neste registro (vazio: registro completo)"
+            )
+            get_instance = extra_fields['instance'].fget
+
+            def get_full_instance(history_instance):
+                return get_instance(DeltaHistory.for_model(model).fill(history_instance))
+
+            extra_fields['instance'] = property(get_full_instance)
+        return extra_fields
+
+    def create_historical_record(self, instance, history_type, using=None):
+        buffer = current_history_buffer()
+        if buffer is None or self.m2m_fields:
+            return super().create_historical_record(instance, history_type, using)
+
+        using = using if self.use_base_model_db else None
+        history_date = getattr(instance, '_history_date', timezone.now())
+        history_user = self.get_history_user(instance)
+        history_change_reason = self.get_change_reason_for_object(instance, history_type, using)
+        manager = getattr(instance, self.manager_name)
+
+        attrs = {field.attname: getattr(instance, field.attname) for field in self.fields_included(instance)}
+        if getattr(manager.model, 'history_relation', None) is not None:
+            attrs['history_relation'] = instance
+
+        history_instance = manager.model(
+            history_date=history_date,
+            history_type=history_type,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            **attrs,
+        )
+        pre_create_historical_record.send(
+            sender=manager.model,
+            instance=instance,
+            history_date=history_date,
+            history_user=history_user,
+            history_change_reason=history_change_reason,
+            history_instance=history_instance,
+            using=using,
+        )
+        buffer.add(history_instance, using=instance._state.db)
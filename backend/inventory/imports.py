@@ -0,0 +1,377 @@
+# backend/inventory/imports.py
+"""
+Importações em lote a partir de arquivos CSV ou XLSX: itens e saldos de
+abertura. Os arquivos são lidos em streaming e validados em blocos: na
+importação de itens, SKU e EAN repetidos são procurados com uma única
+consulta IN por bloco, e filial, categoria e fornecedor são resolvidos em
+dicionários montados uma vez por importação. Os registros válidos de cada
+bloco são gravados com operações em lote, junto com o histórico.
+"""
+import csv
+import io
+import itertools
+import os
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from simple_history.utils import bulk_create_with_history
+
+from . import search
+from .models import ActivityFeedEntry, Branch, Category, Item, ItemImport, Location, StockMovement, Supplier, validate_ean
+
+IMPORT_COLUMNS = [
+    'sku', 'name', 'ean', 'branch', 'category', 'supplier', 'status', 'brand', 'unit_of_measure',
+    'purchase_price', 'sale_price', 'minimum_stock_level', 'internal_code', 'manufacturer_code',
+    'short_description', 'cfop',
+]
+TEXT_COLUMNS = ['sku', 'name', 'brand', 'unit_of_measure', 'internal_code', 'manufacturer_code', 'short_description', 'cfop']
+DECIMAL_COLUMNS = ['purchase_price', 'sale_price']
+
+
+def _clean(value):
+    return '' if value is None else str(value).strip()
+
+
+def read_rows(file, file_name, required=('sku', 'name')):
+    """
+    Lê as linhas de dados de um arquivo CSV ou XLSX como dicts
+    {coluna: texto}, uma por vez. A primeira linha é o cabeçalho e deve
+    conter as colunas `required`.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.xlsx':
+        try:
+            from openpyxl import load_workbook
+            from openpyxl.utils.exceptions import InvalidFileException
+        except ImportError:
+            raise ValidationError('A importação de arquivos XLSX requer o pacote openpyxl.')
+        try:
+            # read_only: as linhas são lidas sob demanda, sem carregar a planilha inteira
+            sheet = load_workbook(file, read_only=True, data_only=True).active
+        except (InvalidFileException, zipfile.BadZipFile, KeyError, OSError):
+            raise ValidationError('Não foi possível abrir a planilha. Verifique se o arquivo .xlsx não está corrompido.')
+        lines = sheet.iter_rows(values_only=True)
+    elif extension == '.csv':
+        lines = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    else:
+        raise ValidationError('Formato de arquivo não suportado. Envie um arquivo .csv ou .xlsx.')
+
+    # Erros de leitura aparecem durante a iteração (o arquivo é lido sob demanda)
+    try:
+        header = [_clean(column).lower() for column in next(lines, [])]
+        missing = set(required) - set(header)
+        if missing:
+            raise ValidationError(f"Colunas obrigatórias ausentes no cabeçalho: {', '.join(sorted(missing))}.")
+
+        for line in lines:
+            values = [_clean(value) for value in line]
+            if any(values):
+                yield dict(zip(header, values))
+    except UnicodeDecodeError:
+        raise ValidationError('O arquivo CSV deve estar codificado em UTF-8.')
+    except csv.Error as exc:
+        raise ValidationError(f'Arquivo CSV inválido: {exc}.')
+    except (zipfile.BadZipFile, KeyError, OSError):
+        raise ValidationError('Não foi possível ler a planilha. Verifique se o arquivo .xlsx não está corrompido.')
+
+
+class ItemImporter:
+    """
+    Processa uma ItemImport. Cada bloco de `chunk_size` linhas é validado e
+    gravado em uma transação que também avança `processed_rows`; ao chamar
+    run() de novo, as linhas já processadas são puladas.
+    """
+
+    def __init__(self, item_import, chunk_size=1000, branches=None):
+        self.item_import = item_import
+        self.chunk_size = chunk_size
+        branches = Branch.objects.all() if branches is None else branches
+        self.branches = {}
+        for branch in branches:
+            self.branches[branch.name.lower()] = branch.pk
+            self.branches[str(branch.pk)] = branch.pk
+        self.categories = {name.lower(): pk for pk, name in Category.objects.values_list('pk', 'name')}
+        self.suppliers = {}
+        for pk, name, cnpj in Supplier.objects.values_list('pk', 'name', 'cnpj'):
+            self.suppliers[name.lower()] = pk
+            if cnpj:
+                self.suppliers[''.join(filter(str.isdigit, cnpj))] = pk
+        self.statuses = {}
+        for value, label in Item.StatusChoices.choices:
+            self.statuses[value.lower()] = value
+            self.statuses[label.lower()] = value
+
+    def run(self):
+        item_import = self.item_import
+        item_import.status = ItemImport.StatusChoices.PROCESSING
+        item_import.save(update_fields=['status', 'updated_at'])
+        try:
+            with item_import.file.open('rb') as file:
+                rows = read_rows(file, item_import.file.name)
+                # Linha 1 é o cabeçalho; pula as linhas já gravadas em execuções anteriores
+                numbered = itertools.islice(enumerate(rows, start=2), item_import.processed_rows, None)
+                while True:
+                    chunk = list(itertools.islice(numbered, self.chunk_size))
+                    if not chunk:
+                        break
+                    self._import_chunk(chunk)
+        except ValidationError as exc:
+            item_import.status = ItemImport.StatusChoices.FAILED
+            item_import.errors = item_import.errors + [{'row': None, 'sku': None, 'errors': {'file': exc.messages}}]
+            item_import.save(update_fields=['status', 'errors', 'updated_at'])
+            return item_import
+
+        item_import.status = ItemImport.StatusChoices.DONE
+        item_import.save(update_fields=['status', 'updated_at'])
+        return item_import
+
+    def _import_chunk(self, chunk):
+        skus = {row.get('sku') for _, row in chunk if row.get('sku')}
+        eans = {row.get('ean') for _, row in chunk if row.get('ean')}
+        taken_skus, taken_eans = set(), set()
+        for sku, ean in Item.all_objects.filter(Q(sku__in=skus) | Q(ean__in=eans)).values_list('sku', 'ean'):
+            taken_skus.add(sku)
+            taken_eans.add(ean)
+
+        items, errors = [], []
+        for row_number, row in chunk:
+            item, row_errors = self._build_item(row, taken_skus, taken_eans)
+            if row_errors:
+                errors.append({'row': row_number, 'sku': row.get('sku', ''), 'errors': row_errors})
+            else:
+                # SKU e EAN também não podem se repetir dentro do próprio arquivo
+                taken_skus.add(item.sku)
+                if item.ean:
+                    taken_eans.add(item.ean)
+                items.append((row_number, item))
+
+        item_import = self.item_import
+        with transaction.atomic():
+            items = self._save_items(items, errors)
+            # Códigos novos podem estar no cache como "não encontrado"
+            Item.objects.invalidate_codes(code for item in items for code in item.lookup_codes())
+            # bulk_create não dispara os signals que mantêm a busca textual e o feed de atividades
+            search.index_items(items)
+            ActivityFeedEntry.objects.add_bulk_created(Item, items)
+            item_import.processed_rows += len(chunk)
+            item_import.created_count += len(items)
+            item_import.errors = item_import.errors + errors
+            item_import.save(update_fields=['processed_rows', 'created_count', 'errors', 'updated_at'])
+
+    def _save_items(self, numbered_items, errors):
+        """
+        Grava os itens do bloco com um bulk_create. Se um SKU ou EAN tiver
+        sido gravado por outra transação depois da verificação do bloco, o
+        lote é desfeito (savepoint) e os itens são gravados um a um, com as
+        linhas recusadas indo para `errors`. Retorna os itens gravados.
+        """
+        user = self.item_import.created_by
+        items = [item for _, item in numbered_items]
+        try:
+            with transaction.atomic():
+                bulk_create_with_history(items, Item, default_user=user)
+            return items
+        except IntegrityError:
+            pass
+
+        saved = []
+        for row_number, item in numbered_items:
+            try:
+                with transaction.atomic():
+                    bulk_create_with_history([item], Item, default_user=user)
+            except IntegrityError:
+                errors.append({
+                    'row': row_number, 'sku': item.sku,
+                    'errors': {'sku': ['Já existe um item com este SKU ou EAN.']},
+                })
+            else:
+                saved.append(item)
+        return saved
+
+    def _build_item(self, row, taken_skus, taken_eans):
+        """Valida uma linha e monta o Item (sem gravar). Retorna (item ou None, {campo: [mensagens]})."""
+        errors = {}
+        values = {}
+
+        for column in TEXT_COLUMNS:
+            value = row.get(column, '')
+            if value and len(value) > Item._meta.get_field(column).max_length:
+                errors[column] = [f'Máximo de {Item._meta.get_field(column).max_length} caracteres.']
+            elif value:
+                values[column] = value
+        for column in ('sku', 'name'):
+            if not row.get(column):
+                errors[column] = ['Este campo é obrigatório.']
+        if values.get('sku') in taken_skus:
+            errors['sku'] = ['Já existe um item com este SKU.']
+
+        ean = row.get('ean')
+        if ean:
+            try:
+                validate_ean(ean)
+            except ValidationError as exc:
+                errors['ean'] = exc.messages
+            else:
+                if ean in taken_eans:
+                    errors['ean'] = ['Já existe um item com este EAN.']
+                values['ean'] = ean
+
+        branch = row.get('branch')
+        if branch:
+            values['branch_id'] = self.branches.get(branch.lower())
+            if values['branch_id'] is None:
+                errors['branch'] = [f'Filial "{branch}" não encontrada.']
+        elif self.item_import.default_branch_id:
+            values['branch_id'] = self.item_import.default_branch_id
+        else:
+            errors['branch'] = ['Informe a filial na linha ou uma filial padrão para a importação.']
+
+        for column, lookup, label in (
+            ('category', self.categories, 'Categoria'),
+            ('supplier', self.suppliers, 'Fornecedor'),
+        ):
+            value = row.get(column)
+            if not value:
+                continue
+            key = value.lower()
+            if key not in lookup and column == 'supplier':
+                # Fornecedor também pode ser informado pelo CNPJ, com ou sem pontuação
+                key = ''.join(filter(str.isdigit, value))
+            if key in lookup:
+                values[f'{column}_id'] = lookup[key]
+            else:
+                errors[column] = [f'{label} "{value}" não encontrado(a).']
+
+        status = row.get('status')
+        if status:
+            values['status'] = self.statuses.get(status.lower())
+            if values['status'] is None:
+                errors['status'] = [f'Status "{status}" inválido.']
+
+        for column in DECIMAL_COLUMNS:
+            value = row.get(column)
+            if not value:
+                continue
+            field = Item._meta.get_field(column)
+            try:
+                values[column] = Decimal(value.replace(',', '.')).quantize(Decimal('0.01'))
+                if values[column] < 0:
+                    raise InvalidOperation
+            except InvalidOperation:
+                errors[column] = ['Informe um valor numérico não negativo.']
+                continue
+            # O banco recusaria o bloco inteiro (ex: DataError no PostgreSQL)
+            if values[column] >= Decimal(10) ** (field.max_digits - field.decimal_places):
+                errors[column] = [f'Máximo de {field.max_digits - field.decimal_places} dígitos antes da vírgula.']
+
+        minimum_stock_level = row.get('minimum_stock_level')
+        if minimum_stock_level:
+            try:
+                values['minimum_stock_level'] = int(minimum_stock_level)
+            except ValueError:
+                errors['minimum_stock_level'] = ['Informe um número inteiro.']
+
+        if errors:
+            return None, errors
+
+        user = self.item_import.created_by
+        item = Item(created_by=user, last_updated_by=user, **values)
+        # bulk_create não passa pelo Item.save(): calcula aqui o indicador do item novo
+        item.is_low_stock = item.total_quantity < item.minimum_stock_level
+        return item, {}
+
+
+OPENING_BALANCE_COLUMNS = ('sku', 'location', 'quantity')
+
+
+class OpeningBalanceLoader:
+    """
+    Carga de saldo de abertura de uma filial: cada linha (sku, location,
+    quantity e, opcionalmente, unit_cost) vira uma movimentação de entrada
+    do tipo `movement_type`. Cada bloco de `chunk_size` linhas é resolvido
+    com uma consulta IN de SKUs e gravado em uma única transação por
+    StockMovement.objects.post_inbound_bulk, que mantém extrato e saldos
+    consistentes. Sem unit_cost, vale o preço de compra do item.
+    """
+
+    def __init__(self, branch, movement_type, user=None, chunk_size=5000, notes='Saldo de abertura'):
+        self.movement_type = movement_type
+        self.user = user
+        self.chunk_size = chunk_size
+        self.notes = notes
+        self.locations = {
+            code.lower(): pk
+            for pk, code in Location.objects.filter(branch=branch).values_list('pk', 'location_code')
+        }
+        self.created_count = 0
+        self.errors = []
+
+    def load(self, rows):
+        """Carrega `rows` (dicts) e retorna (movimentações criadas, erros por linha)."""
+        numbered = enumerate(rows, start=2)  # Linha 1 é o cabeçalho
+        while True:
+            chunk = list(itertools.islice(numbered, self.chunk_size))
+            if not chunk:
+                break
+            self._load_chunk(chunk)
+        return self.created_count, self.errors
+
+    def _load_chunk(self, chunk):
+        items = {
+            sku: (pk, purchase_price)
+            for sku, pk, purchase_price in Item.objects.filter(
+                sku__in={row.get('sku') for _, row in chunk}, deleted_at__isnull=True
+            ).values_list('sku', 'pk', 'purchase_price')
+        }
+
+        movements = []
+        for row_number, row in chunk:
+            movement, row_errors = self._build_movement(row, items)
+            if row_errors:
+                self.errors.append({'row': row_number, 'sku': row.get('sku', ''), 'errors': row_errors})
+            elif movement is not None:
+                movements.append(movement)
+
+        if movements:
+            StockMovement.objects.post_inbound_bulk(movements, user=self.user)
+            self.created_count += len(movements)
+
+    def _build_movement(self, row, items):
+        """Valida uma linha e monta a movimentação (sem gravar). Linhas com quantidade zero são ignoradas."""
+        errors = {}
+        item = items.get(row.get('sku'))
+        if item is None:
+            errors['sku'] = [f'Item "{row.get("sku", "")}" não encontrado.']
+        location_id = self.locations.get(row.get('location', '').lower())
+        if location_id is None:
+            errors['location'] = [f'Locação "{row.get("location", "")}" não encontrada na filial.']
+
+        try:
+            quantity = int(row.get('quantity', ''))
+            if quantity < 0:
+                raise ValueError
+        except ValueError:
+            errors['quantity'] = ['Informe um número inteiro não negativo.']
+
+        unit_cost = (row.get('unit_cost') or '').strip() or None
+        if unit_cost is not None:
+            try:
+                unit_cost = Decimal(unit_cost.replace(',', '.')).quantize(Decimal('0.01'))
+                if unit_cost < 0:
+                    raise InvalidOperation
+            except InvalidOperation:
+                errors['unit_cost'] = ['Informe um valor numérico não negativo.']
+
+        if errors:
+            return None, errors
+        if not quantity:
+            return None, {}
+
+        item_id, purchase_price = item
+        return StockMovement(
+            item_id=item_id, location_id=location_id, movement_type=self.movement_type,
+            quantity=quantity, unit_price=purchase_price if unit_cost is None else unit_cost, user=self.user, notes=self.notes
+        ), {}
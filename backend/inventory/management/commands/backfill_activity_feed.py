@@ -0,0 +1,38 @@
+# backend/inventory/management/commands/backfill_activity_feed.py
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventory.models import ActivityFeedEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Preenche o feed de atividades (ActivityFeedEntry) a partir das tabelas de histórico. '
+        'Registros que já estão no feed são ignorados, então o comando pode ser repetido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Registros de histórico por lote')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        before = ActivityFeedEntry.objects.count()
+
+        for model_name in ActivityFeedEntry.objects.FEED_MODELS:
+            model = apps.get_model('inventory', model_name)
+            rows = model.history.filter(history_user__isnull=False).order_by('history_id')
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self._write(batch)
+                    batch = []
+            self._write(batch)
+            self.stdout.write(f'{model_name}: histórico processado.')
+
+        created = ActivityFeedEntry.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(f'{created} atividades gravadas no feed.'))
+
+    def _write(self, batch):
+        with transaction.atomic():
+            ActivityFeedEntry.objects.add_history(batch)
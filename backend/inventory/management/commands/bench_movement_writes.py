@@ -0,0 +1,99 @@
+# backend/inventory/management/commands/bench_movement_writes.py
+import time
+import uuid
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from inventory.models import (
+    ActivityFeedEntry, Branch, Item, Location, MovementType, StockItem, StockMovement, StockMovementDailySummary,
+)
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede escritas por movimentação e movimentações por segundo no fluxo de gravação, '
+        'com histórico completo (standard) e com STOCK_LEAN_POSTING (lean)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movements', type=int, default=1000, help='Movimentações gravadas em cada modo')
+        parser.add_argument('--mode', choices=['standard', 'lean', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        count = options['movements']
+        modes = ['standard', 'lean'] if options['mode'] == 'both' else [options['mode']]
+
+        fixture = self._create_fixture()
+        try:
+            for mode in modes:
+                with override_settings(STOCK_LEAN_POSTING=mode == 'lean'):
+                    statements, elapsed = self._run(fixture, count)
+                writes = sum(statements[kind] for kind in WRITE_STATEMENTS)
+                detail = ', '.join(f'{kind} {statements[kind] / count:.1f}' for kind in WRITE_STATEMENTS)
+                self.stdout.write(
+                    f'{mode:>8}: {writes / count:.1f} escritas/mov ({detail}), '
+                    f'{sum(statements.values()) / count:.1f} comandos/mov, {count / elapsed:.0f} mov/s'
+                )
+        finally:
+            self._cleanup(fixture)
+
+    def _run(self, fixture, count):
+        """Grava `count` movimentações, cada uma na sua transação, alternando entrada e saída."""
+        statements = Counter()
+
+        def count_statements(execute, sql, params, many, context):
+            statements[sql.lstrip().split(None, 1)[0].upper()] += 1
+            return execute(sql, params, many, context)
+
+        types = [fixture['entry'], fixture['exit']]
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_statements):
+            for index in range(count):
+                movement = StockMovement(
+                    item=fixture['item'], location=fixture['location'], movement_type=types[index % 2],
+                    quantity=1, user=fixture['user']
+                )
+                movement._history_user = fixture['user']
+                movement.save()
+        return statements, time.perf_counter() - started
+
+    def _create_fixture(self):
+        suffix = uuid.uuid4().hex[:8].upper()
+        user = User.objects.create(username=f'bench-{suffix.lower()}')
+        branch = Branch.objects.create(name=f'[BENCH] {suffix}')
+        location = Location.objects.create(branch=branch, location_code=f'BENCH-{suffix}', name='[BENCH]')
+        entry, exit_ = (
+            MovementType.objects.create(name=f'Bench {name} {suffix}', code=f'B{name[0]}_{suffix}', factor=factor)
+            for name, factor in (('Entrada', MovementType.FactorChoices.ADD), ('Saida', MovementType.FactorChoices.SUBTRACT))
+        )
+        item = Item.objects.create(sku=f'BENCH-{suffix}', name='[BENCH]', branch=branch, sale_price=1, purchase_price=1)
+        # Saldo inicial: as saídas nunca falham e toda movimentação passa pelo UPDATE do saldo
+        StockMovement(item=item, location=location, movement_type=entry, quantity=1, user=user).save()
+        return {
+            'user': user, 'branch': branch, 'location': location, 'item': item,
+            'entry': entry, 'exit': exit_,
+        }
+
+    def _cleanup(self, fixture):
+        """Remove definitivamente os registros (e o histórico) criados para a medição."""
+        item, location, branch = fixture['item'], fixture['location'], fixture['branch']
+        with transaction.atomic():
+            ActivityFeedEntry.objects.filter(user=fixture['user']).delete()
+            StockMovement.objects.filter(item=item).delete()
+            StockMovement.history.filter(item_id=item.pk).delete()
+            StockMovementDailySummary.objects.filter(item=item).delete()
+            StockItem.all_objects.filter(item=item).delete()
+            StockItem.history.filter(item_id=item.pk).delete()
+            instances = (
+                (Item, item), (MovementType, fixture['entry']), (MovementType, fixture['exit']),
+                (Location, location), (Branch, branch),
+            )
+            for model, instance in instances:
+                model.all_objects.filter(pk=instance.pk).delete()
+                model.history.filter(id=instance.pk).delete()
+            fixture['user'].delete()
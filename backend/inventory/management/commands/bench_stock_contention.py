@@ -0,0 +1,138 @@
+# backend/inventory/management/commands/bench_stock_contention.py
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from inventory.models import (
+    Branch, Item, Location, MovementType, StockItem, StockMovement, StockMovementDailySummary,
+    StockMovementDailySummaryManager,
+)
+
+
+def post_legacy(movement):
+    """
+    Fluxo de gravação anterior, mantido apenas para comparação: trava o saldo
+    com select_for_update(), soma em Python e grava o StockItem inteiro
+    (com uma linha de histórico por movimentação).
+    """
+    movement.unit_price = movement.resolve_unit_price()
+    with transaction.atomic():
+        models.Model.save(movement)
+        stock_item, created = StockItem.objects.select_for_update().get_or_create(
+            item=movement.item, location=movement.location
+        )
+        stock_item.quantity += movement.get_effective_change()
+        stock_item.save()
+
+
+def post_atomic(movement):
+    """Fluxo atual: UPDATE condicional do saldo (StockItem.apply_change)."""
+    movement.save()
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede movimentações por segundo em um único saldo (StockItem) disputado por várias threads, '
+        'comparando o fluxo anterior (select_for_update) com o UPDATE condicional, '
+        'com e sem a soma nos totais diários (StockMovementDailySummary)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Número de threads concorrentes')
+        parser.add_argument('--movements', type=int, default=200, help='Movimentações por thread')
+        parser.add_argument('--mode', choices=['legacy', 'atomic', 'nosummary', 'both', 'all'], default='both')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite serializa todas as escritas: use PostgreSQL para números representativos.'
+            ))
+
+        threads, per_thread = options['threads'], options['movements']
+        modes = {
+            'both': ['legacy', 'atomic'], 'all': ['legacy', 'atomic', 'nosummary'],
+        }.get(options['mode'], [options['mode']])
+        posters = {'legacy': post_legacy, 'atomic': post_atomic, 'nosummary': post_atomic}
+
+        fixture = self._create_fixture()
+        try:
+            for mode in modes:
+                initial = threads * per_thread
+                stock_item, _ = StockItem.objects.get_or_create(item=fixture['item'], location=fixture['location'])
+                stock_item.quantity = initial
+                stock_item.save()
+
+                # Mede o fluxo atual sem o resumo diário, para isolar o custo dele.
+                # O patch vale para o processo todo e só é desfeito após as threads
+                without_summary = (
+                    mock.patch.object(StockMovementDailySummaryManager, 'add_movements')
+                    if mode == 'nosummary' else nullcontext()
+                )
+                with without_summary:
+                    elapsed, errors = self._run(posters[mode], fixture, threads, per_thread)
+                posted = threads * per_thread - errors
+                stock_item.refresh_from_db()
+                self.stdout.write(
+                    f'{mode:>9}: {posted} movimentações em {elapsed:.2f}s '
+                    f'({posted / elapsed:.0f} mov/s, {errors} erros, '
+                    f'saldo final {stock_item.quantity}, esperado {initial - posted})'
+                )
+        finally:
+            self._cleanup(fixture)
+
+    def _run(self, poster, fixture, threads, per_thread):
+        barrier = threading.Barrier(threads + 1)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(per_thread):
+                    movement = StockMovement(
+                        item=fixture['item'], location=fixture['location'],
+                        movement_type=fixture['movement_type'], quantity=1
+                    )
+                    try:
+                        poster(movement)
+                    except Exception:
+                        errors.append(1)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - started, len(errors)
+
+    def _create_fixture(self):
+        suffix = uuid.uuid4().hex[:8].upper()
+        branch = Branch.objects.create(name=f'[BENCH] {suffix}')
+        location = Location.objects.create(branch=branch, location_code=f'BENCH-{suffix}', name='[BENCH]')
+        movement_type = MovementType.objects.create(
+            name=f'Bench Saida {suffix}', code=f'BENCH_{suffix}', factor=MovementType.FactorChoices.SUBTRACT
+        )
+        item = Item.objects.create(sku=f'BENCH-{suffix}', name='[BENCH]', branch=branch, sale_price=1, purchase_price=1)
+        return {'branch': branch, 'location': location, 'movement_type': movement_type, 'item': item}
+
+    def _cleanup(self, fixture):
+        """Remove definitivamente os registros (e o histórico) criados para a medição."""
+        item, location, branch = fixture['item'], fixture['location'], fixture['branch']
+        movement_type = fixture['movement_type']
+        # O histórico é apagado depois porque a exclusão também gera registros de histórico
+        with transaction.atomic():
+            StockMovement.objects.filter(item=item).delete()
+            StockMovement.history.filter(item_id=item.pk).delete()
+            StockMovementDailySummary.objects.filter(item=item).delete()
+            StockItem.all_objects.filter(item=item).delete()
+            StockItem.history.filter(item_id=item.pk).delete()
+            for model, instance in ((Item, item), (MovementType, movement_type), (Location, location), (Branch, branch)):
+                model.all_objects.filter(pk=instance.pk).delete()
+                model.history.filter(id=instance.pk).delete()
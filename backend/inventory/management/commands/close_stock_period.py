@@ -0,0 +1,78 @@
+# backend/inventory/management/commands/close_stock_period.py
+import calendar
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from inventory.models import StockClosing, StockClosingBalance, StockMovement
+
+
+def month_end(day):
+    """Último dia do mês de `day`."""
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+class Command(BaseCommand):
+    help = 'Gera os fechamentos mensais de estoque (saldo por item e locação ao final de cada mês)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period', type=str,
+            help='Mês a fechar no formato AAAA-MM (padrão: mês anterior). Meses anteriores ainda abertos também são fechados.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Refaz o fechamento do período informado e de todos os posteriores'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tamanho dos lotes de inserção')
+
+    def handle(self, *args, **options):
+        target = self._parse_period(options['period'])
+        if target >= timezone.localdate():
+            raise CommandError('Só é possível fechar meses já encerrados.')
+
+        if options['force']:
+            deleted, _ = StockClosing.objects.filter(period__gte=target).delete()
+            if deleted:
+                self.stdout.write(self.style.WARNING(f'Fechamentos a partir de {target:%m/%Y} removidos.'))
+
+        last_closing = StockClosing.objects.order_by('-period').first()
+        if last_closing is not None:
+            if last_closing.period >= target:
+                self.stdout.write(self.style.SUCCESS(f'O período {target:%m/%Y} já está fechado.'))
+                return
+            next_period = month_end(last_closing.period + timedelta(days=1))
+        else:
+            first_movement = StockMovement.objects.aggregate(first=Min('created_at'))['first']
+            next_period = min(month_end(timezone.localdate(first_movement)), target) if first_movement else target
+
+        while next_period <= target:
+            self._close(next_period, options['batch_size'])
+            next_period = month_end(next_period + timedelta(days=1))
+
+    def _parse_period(self, value):
+        if not value:
+            return timezone.localdate().replace(day=1) - timedelta(days=1)
+        try:
+            year, month = (int(part) for part in value.split('-'))
+            return month_end(date(year, month, 1))
+        except ValueError:
+            raise CommandError('Período inválido. Use o formato AAAA-MM.')
+
+    @transaction.atomic
+    def _close(self, period, batch_size):
+        """Fecha `period` a partir do fechamento anterior mais as movimentações do mês."""
+        _, balances = StockClosing.objects.balances_as_of(period)
+
+        closing = StockClosing.objects.create(period=period)
+        closing_balances = [
+            StockClosingBalance(closing=closing, item_id=item_id, location_id=location_id, quantity=quantity)
+            for (item_id, location_id), quantity in balances.items()
+            if quantity
+        ]
+        StockClosingBalance.objects.bulk_create(closing_balances, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Período {period:%m/%Y} fechado ({len(closing_balances)} saldos).'
+        ))
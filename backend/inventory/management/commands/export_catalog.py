@@ -0,0 +1,38 @@
+# backend/inventory/management/commands/export_catalog.py
+from django.core.management.base import BaseCommand
+from inventory.exports import EXPORT_FORMATS, catalog_header, catalog_rows, export_lines
+from inventory.models import Branch, Item
+
+
+class Command(BaseCommand):
+    help = 'Exporta o catálogo de itens com o saldo por filial em CSV ou NDJSON, gravando o arquivo linha a linha'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', type=str, help='Arquivo de saída (padrão: saída padrão)')
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--branch', action='append', help='ID da filial com coluna de saldo (pode ser repetido)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Linhas lidas do banco por vez')
+
+    def handle(self, *args, **options):
+        branches = Branch.objects.order_by('name')
+        if options['branch']:
+            branches = branches.filter(pk__in=options['branch'])
+        branches = list(branches)
+
+        items = Item.objects.filter(deleted_at__isnull=True)
+        lines = export_lines(
+            options['export_format'], catalog_header(branches),
+            catalog_rows(items, branches, chunk_size=options['chunk_size'])
+        )
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = -1 if options['export_format'] == 'csv' else 0  # o CSV tem uma linha de cabeçalho
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'{count} itens exportados para {options["output"]}.'))
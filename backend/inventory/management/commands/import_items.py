@@ -0,0 +1,72 @@
+# backend/inventory/management/commands/import_items.py
+import os
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from inventory.imports import ItemImporter
+from inventory.models import Branch, ItemImport
+
+
+class Command(BaseCommand):
+    help = 'Importa itens em lote de um arquivo CSV ou XLSX, em blocos gravados um a um (retomável com --resume)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help='Arquivo .csv ou .xlsx (cabeçalho na primeira linha)')
+        parser.add_argument('--resume', type=int, help='ID de uma importação interrompida a retomar')
+        parser.add_argument('--branch', help='ID ou nome da filial usada nas linhas sem a coluna branch')
+        parser.add_argument('--user', help='Usuário registrado como autor dos itens e do histórico')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Linhas validadas e gravadas por bloco')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                item_import = ItemImport.objects.get(pk=options['resume'])
+            except ItemImport.DoesNotExist:
+                raise CommandError(f'Importação {options["resume"]} não encontrada.')
+            if item_import.status == ItemImport.StatusChoices.DONE:
+                raise CommandError('Esta importação já foi concluída.')
+            self.stdout.write(f'Retomando a partir da linha {item_import.processed_rows + 2}...')
+        elif options['file']:
+            item_import = self._create_import(options)
+        else:
+            raise CommandError('Informe o arquivo a importar ou --resume <id>.')
+
+        item_import = ItemImporter(item_import, chunk_size=options['chunk_size']).run()
+
+        for error in item_import.errors:
+            messages = '; '.join(f'{field}: {" ".join(msgs)}' for field, msgs in error['errors'].items())
+            self.stdout.write(self.style.WARNING(f'Linha {error["row"]} ({error["sku"]}): {messages}'))
+        style = self.style.SUCCESS if item_import.status == ItemImport.StatusChoices.DONE else self.style.ERROR
+        self.stdout.write(style(
+            f'Importação {item_import.pk}: {item_import.get_status_display()}. '
+            f'{item_import.created_count} itens criados, {len(item_import.errors)} linhas com erro.'
+        ))
+
+    def _create_import(self, options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f'Arquivo {path} não encontrado.')
+
+        default_branch = None
+        if options['branch']:
+            try:
+                lookup = {'pk': uuid.UUID(options['branch'])}
+            except ValueError:
+                lookup = {'name': options['branch']}
+            default_branch = Branch.objects.filter(**lookup).first()
+            if default_branch is None:
+                raise CommandError(f'Filial {options["branch"]} não encontrada.')
+
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'Usuário {options["user"]} não encontrado.')
+
+        item_import = ItemImport(created_by=user, default_branch=default_branch)
+        with open(path, 'rb') as source:
+            item_import.file.save(os.path.basename(path), File(source))
+        return item_import
@@ -0,0 +1,77 @@
+# backend/inventory/management/commands/load_opening_balances.py
+import os
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from inventory.imports import OPENING_BALANCE_COLUMNS, OpeningBalanceLoader, read_rows
+from inventory.models import Branch, MovementType, StockMovement
+
+
+class Command(BaseCommand):
+    help = (
+        'Carrega o saldo de abertura de uma filial a partir de um arquivo CSV ou XLSX '
+        '(colunas sku, location, quantity e, opcionalmente, unit_cost), gravando extrato e saldos em lote'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Arquivo .csv ou .xlsx (cabeçalho na primeira linha)')
+        parser.add_argument('--branch', required=True, help='ID ou nome da filial (as locações são desta filial)')
+        parser.add_argument(
+            '--movement-type', default='SALDO_INICIAL',
+            help='Código do tipo de movimento de entrada usado na carga (padrão: SALDO_INICIAL)'
+        )
+        parser.add_argument('--user', help='Usuário registrado nas movimentações')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Linhas gravadas por transação')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Carrega mesmo que a filial já tenha movimentações deste tipo'
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['file']):
+            raise CommandError(f'Arquivo {options["file"]} não encontrado.')
+
+        try:
+            lookup = {'pk': uuid.UUID(options['branch'])}
+        except ValueError:
+            lookup = {'name': options['branch']}
+        branch = Branch.objects.filter(**lookup).first()
+        if branch is None:
+            raise CommandError(f'Filial {options["branch"]} não encontrada.')
+
+        movement_type = MovementType.objects.filter(code=options['movement_type']).first()
+        if movement_type is None or not movement_type.is_inbound:
+            raise CommandError(f'Tipo de movimento de entrada {options["movement_type"]} não encontrado.')
+
+        if not options['force'] and StockMovement.objects.filter(
+            movement_type=movement_type, location__branch=branch
+        ).exists():
+            raise CommandError(
+                f'A filial {branch.name} já tem movimentações {movement_type.code}. Use --force para carregar mesmo assim.'
+            )
+
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'Usuário {options["user"]} não encontrado.')
+
+        loader = OpeningBalanceLoader(branch, movement_type, user=user, chunk_size=options['chunk_size'])
+        started = time.perf_counter()
+        try:
+            with open(options['file'], 'rb') as file:
+                created, errors = loader.load(read_rows(file, options['file'], required=OPENING_BALANCE_COLUMNS))
+        except ValidationError as exc:
+            raise CommandError(' '.join(exc.messages))
+
+        for error in errors:
+            messages = '; '.join(f'{field}: {" ".join(msgs)}' for field, msgs in error['errors'].items())
+            self.stdout.write(self.style.WARNING(f'Linha {error["row"]} ({error["sku"]}): {messages}'))
+        style = self.style.SUCCESS if not errors else self.style.WARNING
+        self.stdout.write(style(
+            f'{created} saldos carregados em {time.perf_counter() - started:.1f}s, {len(errors)} linhas com erro.'
+        ))
@@ -0,0 +1,40 @@
+# backend/inventory/management/commands/prune_history.py
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from inventory.history import HistoryPruner, retention_policies
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica a retenção do histórico (HISTORY_RETENTION): apaga, ou arquiva em '
+        'HISTORY_ARCHIVE_ROOT e apaga, os registros de histórico mais antigos que o prazo de cada modelo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models',
+            help='Nome do modelo (ex: StockMovement); pode ser repetido. Padrão: todos da política'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Registros por transação')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta os registros vencidos')
+
+    def handle(self, *args, **options):
+        try:
+            policies = retention_policies(options['models'])
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+
+        for model, days, action in policies:
+            pruner = HistoryPruner(model, days, action, batch_size=options['batch_size'])
+            name = model.__name__
+            if options['dry_run']:
+                self.stdout.write(f'{name}: {pruner.expired().count()} registros com mais de {days} dias.')
+                continue
+
+            removed = pruner.run()
+            if action == 'archive' and removed:
+                self.stdout.write(f'{name}: {removed} registros arquivados em {pruner.archive_path}.')
+            else:
+                self.stdout.write(f'{name}: {removed} registros removidos.')
+
+        self.stdout.write(self.style.SUCCESS('Retenção do histórico aplicada.'))
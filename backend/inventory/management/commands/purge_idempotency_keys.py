@@ -0,0 +1,14 @@
+# backend/inventory/management/commands/purge_idempotency_keys.py
+from django.core.management.base import BaseCommand
+from inventory.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove as chaves de idempotência expiradas ou excedentes (IDEMPOTENCY_KEY_TTL / '
+        'IDEMPOTENCY_KEY_MAX_ENTRIES). Deve ser agendado periodicamente (ex: cron a cada hora)'
+    )
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyKey.objects.purge()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} chaves de idempotência removidas.'))
@@ -0,0 +1,19 @@
+# backend/inventory/management/commands/rebuild_item_search.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from inventory import search
+from inventory.models import ItemSearchIndex
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca textual dos itens (inventory_item_search)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Itens indexados por lote')
+
+    def handle(self, *args, **options):
+        if search._connection() is None:
+            raise CommandError('O banco configurado não tem suporte à busca textual (apenas SQLite e PostgreSQL).')
+        with transaction.atomic(using=ItemSearchIndex.objects.db):
+            total = search.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} itens indexados.'))
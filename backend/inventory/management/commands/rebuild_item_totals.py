@@ -0,0 +1,51 @@
+# backend/inventory/management/commands/rebuild_item_totals.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from inventory.models import Item, StockItem
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o saldo total (e o indicador de estoque baixo) armazenado em cada Item a partir dos saldos (StockItem)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Apenas informa as divergências, sem corrigir')
+
+    def handle(self, *args, **options):
+        expected_total = Coalesce(
+            Subquery(
+                StockItem.objects.filter(item=OuterRef('pk'))
+                .order_by()
+                .values('item')
+                .annotate(total=Sum('quantity'))
+                .values('total'),
+                output_field=IntegerField()
+            ),
+            0
+        )
+
+        with transaction.atomic():
+            drifted = (
+                Item.all_objects.select_for_update()
+                .annotate(expected_total=expected_total)
+                .exclude(total_quantity=F('expected_total'))
+                .values_list('sku', 'total_quantity', 'expected_total')
+            )
+            drifted = list(drifted)
+
+            for sku, stored, expected in drifted:
+                self.stdout.write(self.style.WARNING(f'{sku}: armazenado {stored}, esperado {expected}'))
+
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada.'))
+                return
+
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING(f'{len(drifted)} itens divergentes (nada foi alterado).'))
+                return
+
+            drifted_items = Item.all_objects.filter(sku__in=[sku for sku, _, _ in drifted])
+            updated = drifted_items.update(total_quantity=expected_total)
+            drifted_items.update(is_low_stock=Item.low_stock_expression())
+            self.stdout.write(self.style.SUCCESS(f'{updated} itens corrigidos.'))
@@ -0,0 +1,132 @@
+# backend/inventory/management/commands/rebuild_movement_summary.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from inventory.models import StockMovement, StockMovementDailySummary
+from inventory.utils import day_start
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os totais diários de movimentações (StockMovementDailySummary) a partir do extrato'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from', dest='date_from', type=str,
+            help='Primeiro dia a recalcular no formato AAAA-MM-DD (padrão: todo o extrato)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tamanho dos lotes de atualização')
+
+    def handle(self, *args, **options):
+        date_from = self._parse_date(options['date_from'])
+
+        summaries = StockMovementDailySummary.objects.all()
+        movements = StockMovement.objects.all()
+        if date_from is not None:
+            summaries = summaries.filter(day__gte=date_from)
+            movements = movements.filter(created_at__gte=day_start(date_from))
+
+        days = set(summaries.order_by().values_list('day', flat=True).distinct())
+        days.update(
+            movements.order_by()
+            .annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+            .values_list('day', flat=True).distinct()
+        )
+
+        counts = {'created': 0, 'updated': 0, 'deleted': 0}
+        for day in sorted(days):
+            # Uma transação curta por dia: as gravações dos demais dias não
+            # esperam o recálculo
+            with transaction.atomic():
+                for key, value in self._rebuild_day(day, options['batch_size']).items():
+                    counts[key] += value
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(days)} dias recalculados: {counts['created']} totais criados, "
+            f"{counts['updated']} corrigidos e {counts['deleted']} removidos."
+        ))
+
+    def _rebuild_day(self, day, batch_size):
+        """
+        Corrige os totais de `day`. As linhas existentes do dia são travadas
+        antes de o extrato ser agregado: uma gravação concorrente ou já entrou
+        na soma ou espera a trava e soma sobre o total corrigido. Só as
+        diferenças são gravadas.
+        """
+        existing = {
+            (row.item_id, row.location_id, row.movement_type_id): row
+            for row in StockMovementDailySummary.objects.select_for_update().filter(day=day)
+        }
+        totals = {
+            (row['item_id'], row['location_id'], row['movement_type_id']): {
+                'quantity': row['total_quantity'], 'value': row['total_value'], 'movement_count': row['total_count'],
+            }
+            for row in self._day_totals(day)
+        }
+
+        updated, created = [], []
+        for key, total in totals.items():
+            row = existing.pop(key, None)
+            if row is None:
+                item_id, location_id, movement_type_id = key
+                created.append(StockMovementDailySummary(
+                    day=day, item_id=item_id, location_id=location_id, movement_type_id=movement_type_id, **total
+                ))
+            elif (row.quantity, row.value, row.movement_count) != tuple(total.values()):
+                row.quantity, row.value, row.movement_count = total.values()
+                updated.append(row)
+
+        StockMovementDailySummary.objects.bulk_update(
+            updated, ['quantity', 'value', 'movement_count'], batch_size=batch_size
+        )
+        if existing:
+            StockMovementDailySummary.objects.filter(pk__in=[row.pk for row in existing.values()]).delete()
+        for row in created:
+            try:
+                with transaction.atomic():
+                    row.save(force_insert=True)
+            except IntegrityError:
+                # Criada por uma gravação concorrente depois da trava: a
+                # linha agora é travada e o par é agregado de novo
+                self._rebuild_key(row)
+        return {'created': len(created), 'updated': len(updated), 'deleted': len(existing)}
+
+    def _rebuild_key(self, row):
+        summary = StockMovementDailySummary.objects.select_for_update().get(
+            day=row.day, item_id=row.item_id, location_id=row.location_id, movement_type_id=row.movement_type_id
+        )
+        total, = self._day_totals(
+            row.day, item_id=row.item_id, location_id=row.location_id, movement_type_id=row.movement_type_id
+        )
+        summary.quantity, summary.value, summary.movement_count = (
+            total['total_quantity'], total['total_value'], total['total_count']
+        )
+        summary.save(update_fields=['quantity', 'value', 'movement_count'])
+
+    def _day_totals(self, day, **filters):
+        return (
+            StockMovement.objects
+            .filter(
+                created_at__gte=day_start(day),
+                created_at__lt=day_start(day + timedelta(days=1)),
+                **filters
+            )
+            .order_by()
+            .values('item_id', 'location_id', 'movement_type_id')
+            .annotate(
+                total_quantity=Sum(StockMovement.effective_change_expression()),
+                total_value=Sum(StockMovementDailySummary.value_expression()),
+                total_count=Count('id'),
+            )
+        )
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
@@ -0,0 +1,195 @@
+# backend/inventory/management/commands/rebuild_stock.py
+import multiprocessing
+import os
+from collections import defaultdict
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, connection, connections, models, transaction
+from django.db.models import Sum
+
+# Os modelos são importados dentro das funções: com o start method "spawn"
+# (padrão no macOS e no Windows) cada processo importa este módulo antes de
+# o Django estar configurado (ver _init_worker).
+
+
+def replay_branch(branch_id, chunk_size):
+    """
+    Reprocessa o extrato (StockMovement) de uma filial e compara o saldo
+    esperado de cada par (item, locação) com o StockItem gravado.
+
+    O extrato é lido em streaming (values_list + iterator), então a memória
+    usada é proporcional ao número de pares, não ao número de movimentações.
+    Retorna (branch_id, [(item_id, location_id, saldo gravado ou None, saldo do extrato), ...]).
+    """
+    from inventory.models import MovementType, StockItem, StockMovement
+
+    multipliers = {
+        pk: factor * (units_per_package or 1)
+        for pk, factor, units_per_package in MovementType.all_objects.values_list(
+            'pk', 'factor', 'units_per_package'
+        )
+    }
+
+    expected = defaultdict(int)
+    movements = (
+        StockMovement.objects.filter(location__branch_id=branch_id)
+        .order_by()
+        .values_list('item_id', 'location_id', 'movement_type_id', 'quantity')
+    )
+    for item_id, location_id, movement_type_id, quantity in movements.iterator(chunk_size=chunk_size):
+        expected[(item_id, location_id)] += quantity * multipliers[movement_type_id]
+
+    drift = []
+    stored_balances = (
+        StockItem.all_objects.filter(location__branch_id=branch_id)
+        .order_by()
+        .values_list('item_id', 'location_id', 'quantity')
+    )
+    for item_id, location_id, quantity in stored_balances.iterator(chunk_size=chunk_size):
+        ledger_quantity = expected.pop((item_id, location_id), 0)
+        if quantity != ledger_quantity:
+            drift.append((item_id, location_id, quantity, ledger_quantity))
+
+    # Pares com movimentações mas sem StockItem
+    drift.extend(
+        (item_id, location_id, None, quantity)
+        for (item_id, location_id), quantity in expected.items()
+        if quantity
+    )
+    return branch_id, drift
+
+
+def _init_worker(settings_module):
+    """Configura o Django em cada processo do pool (necessário com "spawn")."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def _replay_branch_worker(args):
+    return replay_branch(*args)
+
+
+class Command(BaseCommand):
+    help = 'Reprocessa o extrato de movimentações e compara (ou corrige) os saldos gravados em StockItem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Corrige os saldos divergentes a partir do extrato')
+        parser.add_argument('--branch', action='append', help='ID da filial a verificar (pode ser repetido)')
+        parser.add_argument(
+            '--workers', type=int,
+            help=(
+                'Número de processos paralelos (um por filial por vez). Padrão: um por núcleo, '
+                'limitado ao número de filiais; 1 no SQLite, que não lê em paralelo com escrita'
+            )
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Linhas lidas do banco por vez')
+
+    def handle(self, *args, **options):
+        from inventory.models import Branch
+
+        branch_ids = list(Branch.all_objects.values_list('pk', flat=True))
+        if options['branch']:
+            branch_ids = [pk for pk in branch_ids if str(pk) in options['branch']]
+
+        tasks = [(branch_id, options['chunk_size']) for branch_id in branch_ids]
+        workers = options['workers']
+        if workers is None:
+            workers = 1 if connection.vendor == 'sqlite' else os.cpu_count() or 1
+        workers = max(1, min(workers, len(tasks)))
+
+        if workers == 1:
+            results = [replay_branch(*task) for task in tasks]
+        else:
+            # Cada processo abre a sua própria conexão com o banco
+            connections.close_all()
+            with multiprocessing.Pool(
+                processes=workers, initializer=_init_worker, initargs=(settings.SETTINGS_MODULE,)
+            ) as pool:
+                results = pool.map(_replay_branch_worker, tasks)
+
+        drift = [row for _, branch_drift in results for row in branch_drift]
+        self._report(drift)
+
+        if drift and options['fix']:
+            self._fix(drift)
+
+    def _report(self, drift):
+        from inventory.models import Item, Location
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência entre o extrato e os saldos.'))
+            return
+
+        items = Item.all_objects.only('sku').in_bulk({item_id for item_id, _, _, _ in drift})
+        locations = Location.all_objects.only('location_code').in_bulk({location_id for _, location_id, _, _ in drift})
+        for item_id, location_id, stored, expected in drift:
+            stored_display = 'sem saldo' if stored is None else stored
+            self.stdout.write(self.style.WARNING(
+                f'{items[item_id].sku} @ {locations[location_id].location_code}: '
+                f'gravado {stored_display}, extrato {expected}'
+            ))
+        self.stdout.write(self.style.WARNING(f'{len(drift)} saldos divergentes.'))
+
+    @transaction.atomic
+    def _fix(self, drift):
+        """
+        Corrige os pares divergentes. A verificação leu extrato e saldos em
+        momentos diferentes, então cada par é conferido de novo aqui: o saldo
+        é travado (select_for_update) e só então o extrato do par é relido.
+        Uma movimentação concorrente ou já está nos dois (foi confirmada) ou
+        em nenhum (o UPDATE dela espera a trava), e a diferença restante é
+        aplicada como incremento. Os totais dos itens são ajustados depois de
+        todos os saldos, como na gravação de lotes.
+        """
+        from inventory.models import Item, StockItem
+
+        fixed, skipped = 0, 0
+        item_deltas = defaultdict(int)
+        # Mesma ordem de travamento usada na gravação de lotes (StockMovementManager.post_batch)
+        for item_id, location_id, _, _ in sorted(drift, key=lambda row: (str(row[0]), str(row[1]))):
+            stock_item = StockItem.all_objects.select_for_update().filter(
+                item_id=item_id, location_id=location_id
+            ).first()
+            expected = self._ledger_quantity(item_id, location_id)
+
+            if stock_item is None:
+                if not expected:
+                    continue
+                try:
+                    stock_item = StockItem(item_id=item_id, location_id=location_id, quantity=expected)
+                    # O total do item é ajustado abaixo, junto com os demais
+                    stock_item._saved_contribution = expected
+                    with transaction.atomic():
+                        stock_item.save_without_historical_record(force_insert=True)
+                except IntegrityError:
+                    # Criado por uma movimentação posterior à verificação
+                    skipped += 1
+                    continue
+                item_deltas[item_id] += expected
+                fixed += 1
+                continue
+
+            delta = expected - stock_item.quantity
+            if not delta:
+                continue
+            StockItem.all_objects.filter(pk=stock_item.pk).update(quantity=models.F('quantity') + delta)
+            # Saldos excluídos (soft delete) não contam no total do item
+            if stock_item.deleted_at is None:
+                item_deltas[item_id] += delta
+            fixed += 1
+
+        Item.objects.add_stock_totals(item_deltas)
+        self.stdout.write(self.style.SUCCESS(f'{fixed} saldos corrigidos.'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'{skipped} saldos criados durante a verificação não foram corrigidos; execute novamente.'
+            ))
+
+    def _ledger_quantity(self, item_id, location_id):
+        from inventory.models import StockMovement
+
+        return StockMovement.objects.filter(item_id=item_id, location_id=location_id).aggregate(
+            total=Sum(StockMovement.effective_change_expression())
+        )['total'] or 0
@@ -10,7 +10,7 @@ from django.utils import timezone
 from faker import Faker
 from inventory.models import (
     Branch, Sector, Location, UserProfile, Supplier, CategoryGroup, 
-    Category, Item, MovementType, StockItem, StockMovement, SystemSettings
+    Category, Item, MovementType, StockItem, StockMovement, StockMovementDailySummary, SystemSettings
 )
 import unicodedata
 
@@ -70,7 +70,7 @@ class Command(BaseCommand):
         items = self._create_items(options['items'], categories, suppliers, branches)
         
         # Criar estoques iniciais
-        self._create_initial_stocks(items, locations)
+        self._create_initial_stocks(items, locations, movement_types)
         
         # Criar movimentos de estoque
         self._create_stock_movements(options['movements'], items, locations, movement_types, users)
@@ -112,6 +112,7 @@ class Command(BaseCommand):
         """Limpa dados existentes (cuidado em produção!)"""
         # Remova a limpeza de UserProfile primeiro para evitar problemas de FK
         StockMovement.objects.all().delete()
+        StockMovementDailySummary.objects.all().delete()
         StockItem.objects.all().delete()
         Item.objects.all().delete()
         MovementType.objects.all().delete()
@@ -470,6 +471,33 @@ class Command(BaseCommand):
                 'requires_approval': True,
                 'affects_finance': False
             },
+            {
+                'code': 'SALDO_INICIAL',
+                'name': 'Saldo Inicial',
+                'factor': 1,
+                'category': 'ADJ',
+                'document_type': 'INT',
+                'requires_approval': False,
+                'affects_finance': True
+            },
+            {
+                'code': 'TRF_ENT',
+                'name': 'Transferencia de Entrada',
+                'factor': 1,
+                'category': 'TRF',
+                'document_type': 'INT',
+                'requires_approval': False,
+                'affects_finance': False
+            },
+            {
+                'code': 'TRF_SAI',
+                'name': 'Transferencia de Saida',
+                'factor': -1,
+                'category': 'TRF',
+                'document_type': 'INT',
+                'requires_approval': False,
+                'affects_finance': False
+            },
         ]
         
         movement_types = []
@@ -558,28 +586,31 @@ class Command(BaseCommand):
         
         return items
 
-    def _create_initial_stocks(self, items, locations):
-        """Cria estoques iniciais para os itens"""
+    def _create_initial_stocks(self, items, locations, movement_types):
+        """Cria estoques iniciais para os itens, como movimentações de saldo de abertura"""
+        opening_type = next(mt for mt in movement_types if mt.code == 'SALDO_INICIAL')
+        movements = []
         for item in items:
             # Cada item em 1-3 locais diferentes
             selected_locations = random.sample(list(locations), min(random.randint(1, 3), len(locations)))
             for location in selected_locations:
-                stock_item, created = StockItem.objects.get_or_create(
-                    item=item,
-                    location=location,
-                    defaults={
-                        'quantity': random.randint(0, 100),
-                        'created_by': None,
-                        'last_updated_by': None
-                    }
-                )
-                if created:
-                    self.stdout.write(self.style.SUCCESS(f'Estoque inicial criado: {item.name} em {location.name}'))
-                else:
-                    self.stdout.write(self.style.SUCCESS(f'Estoque já existe: {item.name} em {location.name}'))
+                quantity = random.randint(0, 100)
+                if quantity:
+                    movements.append(StockMovement(
+                        item=item, location=location, movement_type=opening_type,
+                        quantity=quantity, unit_price=item.purchase_price, notes='Saldo de abertura'
+                    ))
+        StockMovement.objects.post_inbound_bulk(movements)
+        self.stdout.write(self.style.SUCCESS(f'{len(movements)} saldos iniciais criados'))
 
     def _create_stock_movements(self, count, items, locations, movement_types, users):
         """Cria movimentos de estoque"""
+        # Tipos de transferência só são usados em pares (StockMovement.objects.post_transfer)
+        # e o saldo inicial só na carga de abertura
+        movement_types = [
+            mt for mt in movement_types
+            if mt.category != MovementType.MovementCategory.TRANSFER and mt.code != 'SALDO_INICIAL'
+        ]
         for i in range(count):
             item = random.choice(items)
             location = random.choice(locations)
@@ -0,0 +1,20 @@
+# backend/inventory/middleware.py
+from django.conf import settings
+
+from .history import batched_history
+
+
+class BatchedHistoryMiddleware:
+    """
+    Com HISTORY_BATCH_WRITES, grava o histórico de cada request em lote ao
+    final dele (ver inventory.history.batched_history). Deve vir depois do
+    HistoryRequestMiddleware, que identifica o usuário das alterações.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'HISTORY_BATCH_WRITES', False):
+            return self.get_response(request)
+        with batched_history():
+            return self.get_response(request)
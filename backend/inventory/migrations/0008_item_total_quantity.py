@@ -0,0 +1,42 @@
+# Generated by Django 4.2.23 on 2026-10-17 01:58
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_total_quantity(apps, schema_editor):
+    """Preenche o saldo total armazenado a partir dos saldos existentes."""
+    Item = apps.get_model("inventory", "Item")
+    StockItem = apps.get_model("inventory", "StockItem")
+    totals = (
+        StockItem.objects.filter(deleted_at__isnull=True)
+        .values("item_id")
+        .annotate(total=Sum("quantity"))
+    )
+    for row in totals:
+        Item.objects.filter(pk=row["item_id"]).update(total_quantity=row["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0007_activitylog"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalitem",
+            name="total_quantity",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="Saldo Total"
+            ),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="total_quantity",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="Saldo Total"
+            ),
+        ),
+        migrations.RunPython(backfill_total_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("inventory", "0008_item_total_quantity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockClosing",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Data de Criação"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Última Atualização"
+                    ),
+                ),
+                (
+                    "period",
+                    models.DateField(
+                        unique=True, verbose_name="Período (último dia do mês)"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Fechamento de Estoque",
+                "verbose_name_plural": "Fechamentos de Estoque",
+                "ordering": ["-period"],
+            },
+        ),
+        migrations.CreateModel(
+            name="StockClosingBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.IntegerField()),
+            ],
+            options={
+                "verbose_name": "Saldo de Fechamento",
+                "verbose_name_plural": "Saldos de Fechamento",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(
+                fields=["item", "created_at"], name="inventory_s_item_id_a9fe64_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(
+                fields=["location", "created_at"], name="inventory_s_locatio_b95d2f_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockclosingbalance",
+            name="closing",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="balances",
+                to="inventory.stockclosing",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockclosingbalance",
+            name="item",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="closing_balances",
+                to="inventory.item",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockclosingbalance",
+            name="location",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="closing_balances",
+                to="inventory.location",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockclosing",
+            name="created_by",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Fechado por",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockclosingbalance",
+            index=models.Index(
+                fields=["closing", "location"], name="inventory_s_closing_5669a5_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="stockclosingbalance",
+            unique_together={("closing", "item", "location")},
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0010_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalstockmovement",
+            name="transfer_group",
+            field=models.UUIDField(
+                blank=True,
+                db_index=True,
+                help_text="Liga a saída e a entrada de uma mesma transferência entre locações",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockmovement",
+            name="transfer_group",
+            field=models.UUIDField(
+                blank=True,
+                db_index=True,
+                help_text="Liga a saída e a entrada de uma mesma transferência entre locações",
+                null=True,
+            ),
+        ),
+    ]
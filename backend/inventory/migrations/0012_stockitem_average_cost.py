@@ -0,0 +1,48 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:11
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_average_cost(apps, schema_editor):
+    """Sem histórico de custo, os saldos existentes começam pelo preço de compra atual do item."""
+    Item = apps.get_model("inventory", "Item")
+    StockItem = apps.get_model("inventory", "StockItem")
+    StockItem.objects.update(
+        average_cost=Subquery(
+            Item.objects.filter(pk=OuterRef("item_id")).values("purchase_price")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0011_stockmovement_transfer_group"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalstockitem",
+            name="average_cost",
+            field=models.DecimalField(
+                decimal_places=4,
+                default=0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Custo Médio",
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockitem",
+            name="average_cost",
+            field=models.DecimalField(
+                decimal_places=4,
+                default=0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Custo Médio",
+            ),
+        ),
+        migrations.RunPython(backfill_average_cost, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:15
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_is_low_stock(apps, schema_editor):
+    """Marca os itens que já estão abaixo do estoque mínimo."""
+    Item = apps.get_model("inventory", "Item")
+    Item.objects.filter(total_quantity__lt=F("minimum_stock_level")).update(is_low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0012_stockitem_average_cost"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalitem",
+            name="is_low_stock",
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name="Estoque Baixo"
+            ),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="is_low_stock",
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name="Estoque Baixo"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                condition=models.Q(("is_low_stock", True)),
+                fields=["sku"],
+                name="item_low_stock_sku_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_is_low_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0013_item_is_low_stock"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="stockmovement",
+            name="inventory_s_item_id_a9fe64_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="stockmovement",
+            name="inventory_s_locatio_b95d2f_idx",
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(
+                fields=["created_at", "id"], name="inventory_s_created_36aee8_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(
+                fields=["item", "created_at", "id"],
+                name="inventory_s_item_id_378af6_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(
+                fields=["location", "created_at", "id"],
+                name="inventory_s_locatio_a661f2_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0014_stockmovement_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMovementDailySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="Dia")),
+                (
+                    "quantity",
+                    models.IntegerField(default=0, verbose_name="Quantidade Efetiva"),
+                ),
+                (
+                    "value",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=16, verbose_name="Valor"
+                    ),
+                ),
+                (
+                    "movement_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Movimentações"
+                    ),
+                ),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="daily_summaries",
+                        to="inventory.item",
+                    ),
+                ),
+                (
+                    "location",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="daily_summaries",
+                        to="inventory.location",
+                    ),
+                ),
+                (
+                    "movement_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="daily_summaries",
+                        to="inventory.movementtype",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Resumo Diário de Movimentações",
+                "verbose_name_plural": "Resumos Diários de Movimentações",
+                "indexes": [
+                    models.Index(
+                        fields=["day", "location"], name="inventory_s_day_bf08bf_idx"
+                    )
+                ],
+                "unique_together": {("day", "item", "location", "movement_type")},
+            },
+        ),
+    ]
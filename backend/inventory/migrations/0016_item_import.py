@@ -0,0 +1,103 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("inventory", "0015_stock_movement_daily_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ItemImport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Data de Criação"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Última Atualização"
+                    ),
+                ),
+                (
+                    "file",
+                    models.FileField(upload_to="item_imports/", verbose_name="Arquivo"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pendente"),
+                            ("PROCESSING", "Em Processamento"),
+                            ("DONE", "Concluída"),
+                            ("FAILED", "Falhou"),
+                        ],
+                        default="PENDING",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "processed_rows",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Linhas Processadas"
+                    ),
+                ),
+                (
+                    "created_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Itens Criados"
+                    ),
+                ),
+                (
+                    "errors",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="Erros por Linha"
+                    ),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Importado por",
+                    ),
+                ),
+                (
+                    "default_branch",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Usada nas linhas sem a coluna branch",
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="inventory.branch",
+                        verbose_name="Filial Padrão",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Importação de Itens",
+                "verbose_name_plural": "Importações de Itens",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
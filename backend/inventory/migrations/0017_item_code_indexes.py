@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0016_item_import"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["internal_code"], name="item_internal_code_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["manufacturer_code"], name="item_manufacturer_code_idx"
+            ),
+        ),
+    ]
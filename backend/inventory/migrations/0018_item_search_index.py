@@ -0,0 +1,114 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:44
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Cópia congelada do que inventory/search.py fazia quando esta migração foi
+# escrita: a migração não pode mudar junto com o código da busca. Pelo mesmo
+# motivo, `document` é declarado como TextField (o modelo não é gerenciado e
+# o tipo real da coluna é criado por create_search_index).
+DOCUMENT_FIELDS = (
+    "sku", "name", "brand", "ean", "internal_code", "manufacturer_code",
+    "short_description", "long_description",
+)
+CHUNK_SIZE = 400
+SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return SEPARATORS.sub(" ", text).strip()
+
+
+def insert_documents(cursor, connection, pk_field, rows):
+    if not rows:
+        return
+    params = []
+    for pk, *values in rows:
+        params.append(pk_field.get_db_prep_value(pk, connection))
+        params.append(" ".join(filter(None, (normalize(value) for value in values))))
+    if connection.vendor == "sqlite":
+        values = ", ".join(["(%s, %s)"] * len(rows))
+    else:
+        values = ", ".join(["(%s, to_tsvector('simple', %s))"] * len(rows))
+    cursor.execute(f"INSERT INTO inventory_item_search (item_id, document) VALUES {values}", params)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                "CREATE VIRTUAL TABLE inventory_item_search USING fts5("
+                "item_id, document, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                "CREATE TABLE inventory_item_search ("
+                "item_id uuid PRIMARY KEY REFERENCES inventory_item (id) "
+                "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                "CREATE INDEX inventory_item_search_document_idx "
+                "ON inventory_item_search USING GIN (document)"
+            )
+        else:
+            return
+
+        Item = apps.get_model("inventory", "Item")
+        pk_field = Item._meta.pk
+        rows = Item.objects.using(schema_editor.connection.alias).order_by().values_list("pk", *DOCUMENT_FIELDS)
+        batch = []
+        for row in rows.iterator(chunk_size=2000):
+            batch.append(row)
+            if len(batch) >= CHUNK_SIZE:
+                insert_documents(cursor, connection, pk_field, batch)
+                batch = []
+        insert_documents(cursor, connection, pk_field, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor in ("sqlite", "postgresql"):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS inventory_item_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0017_item_code_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ItemSearchIndex",
+            fields=[
+                (
+                    "item",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="inventory.item",
+                    ),
+                ),
+                ("document", models.TextField()),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "verbose_name": "Índice de Busca de Item",
+                "verbose_name_plural": "Índice de Busca de Itens",
+                "db_table": "inventory_item_search",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
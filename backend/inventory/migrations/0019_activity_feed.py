@@ -0,0 +1,85 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("inventory", "0018_item_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivityFeedEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("timestamp", models.DateTimeField(verbose_name="Data")),
+                ("model_name", models.CharField(max_length=30, verbose_name="Modelo")),
+                (
+                    "history_type",
+                    models.CharField(max_length=1, verbose_name="Tipo de Alteração"),
+                ),
+                (
+                    "history_id",
+                    models.PositiveBigIntegerField(
+                        verbose_name="Registro de Histórico"
+                    ),
+                ),
+                ("record_id", models.CharField(max_length=64, verbose_name="Registro")),
+                (
+                    "record_name",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Nome do Registro"
+                    ),
+                ),
+                (
+                    "item_name",
+                    models.CharField(
+                        blank=True, max_length=255, null=True, verbose_name="Item"
+                    ),
+                ),
+                (
+                    "movement_type_name",
+                    models.CharField(
+                        blank=True,
+                        max_length=100,
+                        null=True,
+                        verbose_name="Tipo de Movimento",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="activity_feed",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Atividade do Usuário",
+                "verbose_name_plural": "Atividades dos Usuários",
+                "ordering": ["-timestamp", "-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-timestamp", "-id"],
+                        name="activity_feed_user_time_idx",
+                    )
+                ],
+                "unique_together": {("model_name", "history_id")},
+            },
+        ),
+    ]
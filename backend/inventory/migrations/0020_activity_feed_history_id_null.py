@@ -0,0 +1,20 @@
+# Generated by Django 4.2.23 on 2026-10-17 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0019_activity_feed"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="activityfeedentry",
+            name="history_id",
+            field=models.PositiveBigIntegerField(
+                blank=True, null=True, verbose_name="Registro de Histórico"
+            ),
+        ),
+    ]
@@ -0,0 +1,151 @@
+# Generated by Django 4.2.23 on 2026-10-17 03:03
+
+from django.db import migrations, models
+import django_countries.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0020_activity_feed_history_id_null"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalitem",
+            name="history_changed_fields",
+            field=models.JSONField(
+                blank=True,
+                editable=False,
+                help_text="Campos gravados neste registro (vazio: registro completo)",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="brand",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="cfop",
+            field=models.CharField(
+                blank=True, help_text="CFOP", max_length=4, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="created_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Data de Criação"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="internal_code",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="is_low_stock",
+            field=models.BooleanField(
+                blank=True,
+                default=False,
+                editable=False,
+                null=True,
+                verbose_name="Estoque Baixo",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="long_description",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="manufacturer_code",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="minimum_stock_level",
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="origin",
+            field=django_countries.fields.CountryField(
+                blank=True, max_length=2, null=True, verbose_name="País de Origem"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="purchase_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, default=0, max_digits=10, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="sale_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, default=0, max_digits=10, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="short_description",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("ACTIVE", "Ativo"),
+                    ("DISCONTINUED", "Fora de Linha"),
+                    ("INACTIVE", "Inativo"),
+                ],
+                default="ACTIVE",
+                max_length=12,
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="total_quantity",
+            field=models.IntegerField(
+                blank=True,
+                default=0,
+                editable=False,
+                null=True,
+                verbose_name="Saldo Total",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="unit_of_measure",
+            field=models.CharField(
+                blank=True,
+                default="UN",
+                max_length=20,
+                null=True,
+                verbose_name="Unidade de Medida",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="updated_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Última Atualização"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalitem",
+            name="warranty_days",
+            field=models.IntegerField(
+                blank=True, default=0, null=True, verbose_name="Garantia (dias)"
+            ),
+        ),
+    ]
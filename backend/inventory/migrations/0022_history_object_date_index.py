@@ -0,0 +1,90 @@
+# Generated by Django 4.2.23 on 2026-10-17 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0021_item_history_delta"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="historicalbranch",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_de273a_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalcategory",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_6ad29b_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalcategorygroup",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_10966e_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalitem",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_533cf3_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicallocation",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_b2d406_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalmovementtype",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_b1d537_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalsector",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_d5dae6_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalstockitem",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_47173c_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalstockmovement",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_0bdfeb_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalsupplier",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_6f231e_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicaluserprofile",
+            index=models.Index(
+                fields=["id", "history_date", "history_id"],
+                name="inventory_h_id_2172fd_idx",
+            ),
+        ),
+    ]
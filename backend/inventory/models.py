@@ -1,18 +1,26 @@
 # backend/inventory/models.py
 from inventory.validators import validate_cnpj_format
 from solo.models import SingletonModel 
-from django.db import models, transaction
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User, Group
 from django.db.models import Sum
 from django.core.exceptions import ValidationError
-from simple_history.models import HistoricalRecords
-from django.db.models.functions import Coalesce
+from .history import BufferedHistoricalRecords
+from django.db.models.functions import Cast, Coalesce
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import timedelta
 import uuid
 from stdnum.ean import is_valid
 from django.core.validators import MinValueValidator, RegexValidator
 from django_countries.fields import CountryField
 from decimal import Decimal
-from .utils import optimize_image
+from simple_history.utils import bulk_create_with_history
+from .utils import day_start, optimize_image
+
+logger = logging.getLogger(__name__)
  
  
 class TimeStampedModel(models.Model):
@@ -144,7 +152,7 @@ class SoftDeleteMixin(models.Model):
 
 class BaseModel(UUIDMixin, TimeStampedModel, AuditMixin, IsActiveMixin, SoftDeleteMixin):
     """Um modelo base que inclui timestamps, auditoria e status de ativação."""
-    history = HistoricalRecords(inherit=True)
+    history = BufferedHistoricalRecords(inherit=True)
 
     class Meta:
         ordering = ['-created_at']
@@ -184,7 +192,7 @@ class Location(BaseModel):
         return f"{self.name} ({self.branch.name})"
 
 class UserProfile(TimeStampedModel):
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     manager = models.ForeignKey(
         'self', 
@@ -304,19 +312,96 @@ class Category(BaseModel):
         return self.name
 
 class ItemManager(models.Manager):
+    # Campos de código aceitos na leitura por scanner, em ordem de prioridade
+    CODE_FIELDS = ('sku', 'ean', 'internal_code', 'manufacturer_code')
+
     def get_queryset(self):
         return super().get_queryset()
 
+    @staticmethod
+    def code_cache_key(code):
+        return f"item-code:{hashlib.sha1(code.encode('utf-8')).hexdigest()}"
+
+    def resolve_code(self, code):
+        """
+        Itens (não excluídos) cujo SKU, EAN, código interno ou código do
+        fabricante é exatamente `code`, como [(campo, item_id), ...] na ordem
+        de CODE_FIELDS. O resultado, inclusive vazio, fica no cache até
+        ITEM_CODE_CACHE_TIMEOUT ou até um item com o código ser gravado.
+        """
+        from django.core.cache import cache
+        key = self.code_cache_key(code)
+        try:
+            matches = cache.get(key)
+        except Exception:
+            # Cache indisponível: resolve pelo banco
+            logger.warning('Falha ao ler o cache de resolução de códigos', exc_info=True)
+            matches = None
+        if matches is None:
+            condition = models.Q()
+            for field in self.CODE_FIELDS:
+                condition |= models.Q(**{field: code})
+            rows = self.filter(condition, deleted_at__isnull=True).values_list('pk', *self.CODE_FIELDS)
+            matches = sorted(
+                (
+                    (field, pk)
+                    for pk, *codes in rows
+                    for field, value in zip(self.CODE_FIELDS, codes)
+                    if value == code
+                ),
+                key=lambda match: self.CODE_FIELDS.index(match[0])
+            )
+            try:
+                cache.set(key, matches, settings.ITEM_CODE_CACHE_TIMEOUT)
+            except Exception:
+                logger.warning('Falha ao gravar o cache de resolução de códigos', exc_info=True)
+        return matches
+
+    def invalidate_codes(self, codes):
+        """
+        Remove do cache a resolução dos `codes`. Repete a remoção após o
+        commit, para descartar um valor antigo lido por outra requisição
+        enquanto a transação estava aberta. Uma falha do cache (ex: servidor
+        fora do ar) é registrada e não impede a gravação do item; um valor
+        que não pôde ser removido expira em ITEM_CODE_CACHE_TIMEOUT.
+        """
+        keys = [self.code_cache_key(code) for code in set(codes) if code]
+        if keys:
+            self._delete_cached_codes(keys)
+            transaction.on_commit(lambda: self._delete_cached_codes(keys))
+
+    @staticmethod
+    def _delete_cached_codes(keys):
+        from django.core.cache import cache
+        try:
+            cache.delete_many(keys)
+        except Exception:
+            logger.warning('Falha ao invalidar %d códigos no cache de resolução', len(keys), exc_info=True)
+
+    def add_stock_totals(self, deltas):
+        """
+        Soma as variações de saldo {item_id: delta} em total_quantity (e
+        recalcula is_low_stock), em ordem de item_id. Chamado depois de
+        StockItem.apply_change, para que toda gravação trave primeiro os
+        saldos e só depois os itens: um lote que passa por várias locações do
+        mesmo item não segura o Item enquanto espera outro StockItem.
+        """
+        for item_id in sorted(deltas, key=str):
+            delta = deltas[item_id]
+            if delta:
+                self.model.all_objects.filter(pk=item_id).update(
+                    total_quantity=models.F('total_quantity') + delta,
+                    is_low_stock=self.model.low_stock_expression(delta)
+                )
+
     def active(self):
         """Retorna apenas itens com status ATIVO."""
         return self.get_queryset().filter(status=Item.StatusChoices.ACTIVE)
 
     def low_stock(self):
         """Retorna itens ativos com estoque abaixo do mínimo."""
-        # Exemplo de como a lógica de negócio pode ser encapsulada
-        return self.active().annotate(
-            total_quantity=Coalesce(Sum('stock_items__quantity'), 0)
-        ).filter(total_quantity__lt=models.F('minimum_stock_level'))
+        # Mantido no próprio item junto com o saldo total (ver Item.low_stock_expression)
+        return self.active().filter(is_low_stock=True)
 
 def validate_ean(value):
     """Verifica se o valor é um EAN-13 válido."""
@@ -368,19 +453,76 @@ class Item(BaseModel, PhysicalPropertiesMixin):
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     unit_of_measure = models.CharField(max_length=20, default="UN", verbose_name="Unidade de Medida")
     minimum_stock_level = models.IntegerField(default=0)
+    # Saldo total do item em todas as locações. Mantido pelo fluxo de estoque
+    # (StockItem.apply_change / StockItem.save) na mesma transação da movimentação.
+    total_quantity = models.IntegerField(default=0, editable=False, verbose_name="Saldo Total")
+    # total_quantity < minimum_stock_level, atualizado junto com o saldo total e
+    # quando o estoque mínimo muda (ver low_stock_expression)
+    is_low_stock = models.BooleanField(default=False, editable=False, verbose_name="Estoque Baixo")
+
+    # Campos mantidos pelo fluxo de estoque: nunca são gravados a partir da
+    # instância em memória, que pode estar desatualizada.
+    STOCK_MAINTAINED_FIELDS = ('total_quantity', 'is_low_stock')
+    # Histórico em delta (ver history.DeltaHistory): só estes campos são
+    # gravados em todo registro; os demais, apenas quando mudam.
+    HISTORY_DELTA_KEEP_FIELDS = ('id', 'sku', 'name')
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # Índice parcial: só os itens abaixo do mínimo, na ordem da listagem de reposição
+            models.Index(fields=['sku'], condition=models.Q(is_low_stock=True), name='item_low_stock_sku_idx'),
+            # Busca exata por código (sku e ean já são únicos e indexados)
+            models.Index(fields=['internal_code'], name='item_internal_code_idx'),
+            models.Index(fields=['manufacturer_code'], name='item_manufacturer_code_idx'),
+        ]
+
+    # Códigos do item na última leitura/gravação, para invalidar o cache de resolução
+    _saved_codes = ()
+    # minimum_stock_level na última leitura/gravação (None: desconhecido)
+    _saved_minimum_stock_level = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_codes = instance.lookup_codes()
+        instance._saved_minimum_stock_level = instance.__dict__.get('minimum_stock_level')
+        return instance
+
+    def lookup_codes(self):
+        """
+        Valores atuais dos campos de código (ver ItemManager.resolve_code).
+        Campos adiados (only/defer) ficam de fora, sem disparar consultas.
+        """
+        return tuple(self.__dict__.get(field) for field in ItemManager.CODE_FIELDS)
+
+    @staticmethod
+    def low_stock_expression(total_change=0):
+        """
+        Valor de is_low_stock em SQL. `total_change` é a variação aplicada a
+        total_quantity no mesmo UPDATE (que ainda enxerga o valor antigo).
+        """
+        return models.ExpressionWrapper(
+            models.Q(total_quantity__lt=models.F('minimum_stock_level') - total_change),
+            output_field=models.BooleanField()
+        )
 
     def delete(self, using=None, keep_parents=False):
         """
         Soft delete que só permite a exclusão se o saldo total do item for zero.
         """
-        if self.total_quantity > 0:
-            raise ValidationError(
-                f"Não é possível excluir o item '{self.name}' pois ele ainda possui saldo em estoque ({self.total_quantity} unidades)."
-            )
-        
-        from django.utils import timezone
-        self.deleted_at = timezone.now()
-        self.save(update_fields=["deleted_at"])
+        with transaction.atomic():
+            # Relê o saldo armazenado com trava, para não decidir com um valor antigo
+            self.total_quantity = Item.all_objects.select_for_update().values_list(
+                'total_quantity', flat=True
+            ).get(pk=self.pk)
+            if self.total_quantity > 0:
+                raise ValidationError(
+                    f"Não é possível excluir o item '{self.name}' pois ele ainda possui saldo em estoque ({self.total_quantity} unidades)."
+                )
+
+            from django.utils import timezone
+            self.deleted_at = timezone.now()
+            self.save(update_fields=["deleted_at"])
 
         # 👇 REINTRODUZA ESTA LINHA PARA A EXCLUSÃO EM CASCATA
         # self.stock_items.all_with_deleted().update(deleted_at=timezone.now())
@@ -402,17 +544,28 @@ class Item(BaseModel, PhysicalPropertiesMixin):
         if self.photo and not self.photo.name.endswith('.webp'):
             new_name, content = optimize_image(self.photo)
             self.photo.save(new_name, content, save=False)
-        super().save(*args, **kwargs)
+        if self._state.adding:
+            self.is_low_stock = self.total_quantity < self.minimum_stock_level
+        elif kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STOCK_MAINTAINED_FIELDS
+            ]
+
+        with transaction.atomic():
+            min_level_changed = (
+                'minimum_stock_level' in (kwargs.get('update_fields') or ())
+                and self.minimum_stock_level != self._saved_minimum_stock_level
+            )
+            super().save(*args, **kwargs)
+            Item.objects.invalidate_codes(self._saved_codes + self.lookup_codes())
+            self._saved_codes = self.lookup_codes()
+            self._saved_minimum_stock_level = self.minimum_stock_level
+            if min_level_changed:
+                # O saldo em memória pode estar desatualizado: compara no banco
+                Item.all_objects.filter(pk=self.pk).update(is_low_stock=Item.low_stock_expression())
+                self.refresh_from_db(fields=list(self.STOCK_MAINTAINED_FIELDS))
 
-    @property
-    def total_quantity(self):
-        total = self.stock_items.aggregate(total=Sum('quantity'))['total']
-        return total if total is not None else 0
-        
-    @property
-    def is_low_stock(self):
-        return self.total_quantity < self.minimum_stock_level
-    
     @property
     def active(self):
         """Retorna True se o status do item for 'ATIVO'."""
@@ -576,15 +729,147 @@ class StockItem(BaseModel):
         related_name='stock_items'
     )
     quantity = models.IntegerField(default=0)  # Permite estoque negativo temporário
+    # Custo médio ponderado das unidades em estoque, mantido por apply_change
+    average_cost = models.DecimalField(
+        max_digits=12, decimal_places=4, default=0, editable=False, verbose_name="Custo Médio"
+    )
 
     class Meta:
         unique_together = ('item', 'location')
         verbose_name = "Saldo de Estoque"
         verbose_name_plural = "Saldos de Estoque"
 
+    # Quanto este saldo contribuía para Item.total_quantity na última leitura/gravação
+    _saved_contribution = 0
+
     def __str__(self):
         return f"{self.item.name} @ {self.location.name} (Qty: {self.quantity})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_contribution = instance._stock_contribution()
+        return instance
+
+    def _stock_contribution(self):
+        """Saldos excluídos (soft delete) não contam no total do item."""
+        return self.quantity if self.deleted_at is None else 0
+
+    def save(self, *args, **kwargs):
+        """
+        Grava o saldo e aplica a diferença em Item.total_quantity na mesma
+        transação, com um UPDATE relativo (sem reagregar os saldos do item).
+        """
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            contribution = self._stock_contribution()
+            delta = contribution - self._saved_contribution
+            if delta:
+                Item.all_objects.filter(pk=self.item_id).update(
+                    total_quantity=models.F('total_quantity') + delta,
+                    is_low_stock=Item.low_stock_expression(delta)
+                )
+                if StockItem.item.is_cached(self):
+                    self.item.total_quantity += delta
+                    self.item.is_low_stock = self.item.total_quantity < self.item.minimum_stock_level
+            self._saved_contribution = contribution
+
+    @classmethod
+    def apply_change(cls, item_id, location_id, delta, received=0, received_value=None):
+        """
+        Aplica `delta` ao saldo do par (item, locação) com um único UPDATE
+        condicional (quantity = quantity + delta WHERE quantity + delta >= 0
+        para saídas), sem ler o saldo antes nem gravar histórico do StockItem:
+        o extrato (StockMovement) já registra cada alteração. O saldo fica
+        travado apenas durante o UPDATE até o fim da transação.
+
+        `received` / `received_value` são as unidades e o valor das entradas
+        incluídas em `delta`; com eles o custo médio ponderado é recalculado
+        no mesmo UPDATE. Saídas não alteram o custo médio.
+
+        Cria (ou reativa) o saldo se ainda não existir, apenas para entradas
+        e também sem histórico. Não altera Item.total_quantity: quem chama
+        soma as variações com Item.objects.add_stock_totals depois de aplicar
+        todos os saldos. Retorna False, sem alterar nada, se uma saída
+        deixaria o saldo negativo.
+        """
+        from django.utils import timezone
+        if not delta and not received:
+            return True
+
+        values = {'quantity': models.F('quantity') + delta, 'updated_at': timezone.now()}
+        initial_cost = Decimal(0)
+        if received:
+            received_value = Decimal(received_value)
+            initial_cost = received_value / received
+            values['average_cost'] = models.Case(
+                models.When(
+                    quantity__gt=0,
+                    # Divisor em ponto flutuante: no SQLite o CAST AS NUMERIC do
+                    # Django truncaria a divisão para inteiro
+                    then=(models.F('quantity') * models.F('average_cost') + received_value)
+                    / Cast(models.F('quantity') + received, output_field=models.FloatField()),
+                ),
+                default=models.Value(initial_cost),
+                output_field=models.DecimalField(max_digits=12, decimal_places=4),
+            )
+
+        # Sem savepoint: uma saída recusada não alterou nada, e qualquer erro
+        # desfaz a transação de quem chamou
+        with transaction.atomic(savepoint=False):
+            while True:
+                stock_items = cls.objects.filter(item_id=item_id, location_id=location_id)
+                if delta < 0:
+                    stock_items = stock_items.filter(quantity__gte=-delta)
+                if stock_items.update(**values):
+                    break
+                if delta < 0:
+                    return False
+                try:
+                    # Primeira entrada do item nesta locação
+                    stock_item = cls(
+                        item_id=item_id, location_id=location_id, quantity=delta, average_cost=initial_cost
+                    )
+                    # O total do item fica com quem chamou (ver StockItem.save)
+                    stock_item._saved_contribution = delta
+                    with transaction.atomic():
+                        stock_item.save_without_historical_record(force_insert=True)
+                    return True
+                except IntegrityError:
+                    # Saldo excluído (soft delete) volta a valer a partir desta entrada
+                    deleted = cls.all_objects.select_for_update().filter(
+                        item_id=item_id, location_id=location_id, deleted_at__isnull=False
+                    ).first()
+                    if deleted is not None:
+                        deleted.deleted_at = None
+                        deleted.quantity = delta
+                        deleted.average_cost = initial_cost
+                        deleted._saved_contribution = delta
+                        deleted.save_without_historical_record()
+                        return True
+                    # Criado por uma transação concorrente: repete o UPDATE
+                    continue
+        return True
+
+    @staticmethod
+    def stock_value_expression(prefix=''):
+        """Valor do saldo (quantidade x custo médio) para agregações no banco."""
+        return models.ExpressionWrapper(
+            models.F(f'{prefix}quantity') * models.F(f'{prefix}average_cost'),
+            output_field=models.DecimalField(max_digits=16, decimal_places=2)
+        )
+
+    @property
+    def stock_value(self):
+        return self.quantity * self.average_cost
+
+    @classmethod
+    def insufficient_stock_message(cls, item_id, location_id, requested):
+        current = cls.objects.filter(item_id=item_id, location_id=location_id).values_list(
+            'quantity', flat=True
+        ).first() or 0
+        return f"Estoque insuficiente. Saldo atual: {current}, Saída solicitada: {requested}"
+
     def delete(self, using=None, keep_parents=False):
         """
         Soft delete customizado: marca como deletado em vez de remover.
@@ -600,9 +885,224 @@ class StockItem(BaseModel):
         self.deleted_at = None
         self.save()
 
+class StockBatchError(ValidationError):
+    """
+    Erro de um lote de movimentações. Guarda em `line_errors` uma lista
+    alinhada com as linhas enviadas ({} para as linhas sem erro).
+    """
+    def __init__(self, line_errors):
+        super().__init__("O lote de movimentações não pôde ser registrado.")
+        self.line_errors = line_errors
+
+class StockMovementManager(models.Manager):
+    def transfer_types(self):
+        """
+        Retorna os tipos de movimento (saída, entrada) usados nas duas pernas
+        de uma transferência: os tipos ativos da categoria TRANSFER.
+        """
+        transfer_types = MovementType.objects.filter(
+            category=MovementType.MovementCategory.TRANSFER, is_active=True
+        ).order_by('code')
+        outbound = next((mt for mt in transfer_types if mt.is_outbound), None)
+        inbound = next((mt for mt in transfer_types if mt.is_inbound), None)
+        if outbound is None or inbound is None:
+            raise ValidationError(
+                "Cadastre tipos de movimento ativos de transferência (categoria TRF) de saída e de entrada."
+            )
+        return outbound, inbound
+
+    def build_transfer(self, item, quantity, from_location, to_location, user=None, notes='', transfer_types=None):
+        """
+        Monta (sem gravar) as duas pernas de uma transferência: a saída na
+        locação de origem e a entrada na de destino, ligadas pelo mesmo
+        transfer_group. Grave-as com post_batch para que ambas entrem na
+        mesma transação.
+        """
+        if from_location == to_location:
+            raise ValidationError("A locação de destino deve ser diferente da locação de origem.")
+        outbound_type, inbound_type = transfer_types or self.transfer_types()
+        transfer_group = uuid.uuid4()
+        # O estoque muda de lugar pelo custo médio da origem (ver resolve_unit_price)
+        source_cost = StockItem.objects.filter(item=item, location=from_location).values_list(
+            'average_cost', flat=True
+        ).first()
+        unit_price = source_cost.quantize(Decimal('0.01')) if source_cost else None
+        return [
+            self.model(
+                item=item, location=location, movement_type=movement_type, quantity=quantity,
+                user=user, notes=notes, transfer_group=transfer_group, unit_price=unit_price
+            )
+            for location, movement_type in ((from_location, outbound_type), (to_location, inbound_type))
+        ]
+
+    def post_transfer(self, item, quantity, from_location, to_location, user=None, notes=''):
+        """Registra uma transferência entre locações em uma única transação."""
+        legs = self.build_transfer(item, quantity, from_location, to_location, user=user, notes=notes)
+        return self.post_batch(legs, user=user)
+
+    def post_batch(self, movements, user=None):
+        """
+        Registra um lote de movimentações em uma única transação.
+
+        O efeito líquido do lote é aplicado uma única vez a cada saldo
+        (StockItem.apply_change), sempre na mesma ordem de pares (item, locação),
+        e só depois ao total de cada item, em ordem de item: todos os saldos
+        são travados antes de qualquer Item, como na gravação unitária, o que
+        evita deadlocks entre lotes e movimentações concorrentes. Os movimentos são
+        gravados com bulk_create. Se qualquer linha falhar,
+        nada é gravado e um StockBatchError é levantado com os erros por linha.
+        """
+        movements = list(movements)
+        line_errors = [{} for _ in movements]
+        changes = {}
+
+        for index, movement in enumerate(movements):
+            if user is not None and movement.user_id is None:
+                movement.user = user
+            try:
+                movement.unit_price = movement.resolve_unit_price()
+            except ValidationError as e:
+                line_errors[index] = {'non_field_errors': e.messages}
+                continue
+            change = changes.setdefault(
+                (movement.item_id, movement.location_id),
+                {'delta': 0, 'outgoing': 0, 'received': 0, 'received_value': Decimal(0), 'lines': []}
+            )
+            effective_change = movement.get_effective_change()
+            change['delta'] += effective_change
+            if effective_change < 0:
+                change['outgoing'] -= effective_change
+            else:
+                change['received'] += effective_change
+                change['received_value'] += effective_change * movement.unit_price
+            change['lines'].append(index)
+
+        if any(line_errors):
+            raise StockBatchError(line_errors)
+
+        with transaction.atomic():
+            # Ordem determinística de travamento: (item, locação)
+            for item_id, location_id in sorted(changes, key=lambda key: (str(key[0]), str(key[1]))):
+                change = changes[(item_id, location_id)]
+                if not StockItem.apply_change(
+                    item_id, location_id, change['delta'],
+                    received=change['received'], received_value=change['received_value']
+                ):
+                    message = StockItem.insufficient_stock_message(item_id, location_id, change['outgoing'])
+                    for index in change['lines']:
+                        if movements[index].movement_type.is_outbound:
+                            line_errors[index] = {'non_field_errors': [message]}
+
+            if any(line_errors):
+                raise StockBatchError(line_errors)
+
+            item_deltas = defaultdict(int)
+            for (item_id, _), change in changes.items():
+                item_deltas[item_id] += change['delta']
+            Item.objects.add_stock_totals(item_deltas)
+
+            created = self._bulk_create(movements, user)
+            StockMovementDailySummary.objects.add_movements(created)
+            return created
+
+    def post_inbound_bulk(self, movements, user=None):
+        """
+        Grava um bloco grande de entradas (ex: carga de saldo de abertura) com
+        operações em lote, em uma única transação: os saldos afetados são lidos
+        com uma consulta travada e gravados com bulk_update / bulk_create, o
+        total dos itens é recalculado por subconsulta e o extrato é inserido
+        com bulk_create_with_history. O custo médio segue a mesma regra de
+        StockItem.apply_change.
+
+        Todas as movimentações devem ser de entrada e já ter unit_price.
+        """
+        from django.utils import timezone
+        if any(not movement.movement_type.is_inbound for movement in movements):
+            raise ValidationError("A gravação em lote aceita apenas movimentações de entrada.")
+
+        changes = {}
+        for movement in movements:
+            movement.user = movement.user or user
+            effective_change = movement.get_effective_change()
+            change = changes.setdefault((movement.item_id, movement.location_id), [0, Decimal(0)])
+            change[0] += effective_change
+            change[1] += effective_change * Decimal(str(movement.unit_price))
+
+        with transaction.atomic():
+            stock_items = StockItem.all_objects.select_for_update().filter(
+                item_id__in={item_id for item_id, _ in changes},
+                location_id__in={location_id for _, location_id in changes},
+            )
+            existing = {(row.item_id, row.location_id): row for row in stock_items}
+
+            now = timezone.now()
+            updated, created = [], []
+            for (item_id, location_id), (received, received_value) in changes.items():
+                if not received:
+                    continue
+                stock_item = existing.get((item_id, location_id))
+                if stock_item is None:
+                    created.append(StockItem(
+                        item_id=item_id, location_id=location_id, quantity=received,
+                        average_cost=received_value / received
+                    ))
+                    continue
+                if stock_item.deleted_at is not None:
+                    # Saldo excluído (soft delete) volta a valer a partir desta entrada
+                    stock_item.deleted_at, stock_item.quantity, stock_item.average_cost = None, 0, Decimal(0)
+                if stock_item.quantity > 0:
+                    stock_item.average_cost = (
+                        (stock_item.quantity * stock_item.average_cost + received_value)
+                        / (stock_item.quantity + received)
+                    )
+                else:
+                    stock_item.average_cost = received_value / received
+                stock_item.quantity += received
+                stock_item.updated_at = now
+                updated.append(stock_item)
+
+            for stock_item in updated + created:
+                stock_item.average_cost = stock_item.average_cost.quantize(Decimal('0.0001'))
+            StockItem.all_objects.bulk_update(
+                updated, ['quantity', 'average_cost', 'deleted_at', 'updated_at'], batch_size=1000
+            )
+            StockItem.objects.bulk_create(created, batch_size=1000)
+
+            affected_items = Item.all_objects.filter(pk__in={item_id for item_id, _ in changes})
+            affected_items.update(total_quantity=Coalesce(
+                models.Subquery(
+                    StockItem.objects.filter(item=models.OuterRef('pk'))
+                    .order_by()
+                    .values('item')
+                    .annotate(total=Sum('quantity'))
+                    .values('total'),
+                    output_field=models.IntegerField()
+                ),
+                0
+            ))
+            affected_items.update(is_low_stock=Item.low_stock_expression())
+
+            created_movements = self._bulk_create(movements, user, batch_size=1000)
+            StockMovementDailySummary.objects.add_movements_in_bulk(created_movements)
+            return created_movements
+
+    def _bulk_create(self, movements, user=None, batch_size=None):
+        """
+        Grava as movimentações em lote com o histórico (ou sem ele, com
+        STOCK_LEAN_POSTING) e as registra no feed de atividades.
+        """
+        if settings.STOCK_LEAN_POSTING:
+            created = self.bulk_create(movements, batch_size=batch_size)
+            ActivityFeedEntry.objects.add_movements(created, user)
+        else:
+            created = bulk_create_with_history(movements, self.model, batch_size=batch_size, default_user=user)
+            ActivityFeedEntry.objects.add_bulk_created(self.model, created)
+        return created
+
 class StockMovement(TimeStampedModel):
     """Registra cada transação de estoque (o extrato)."""
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
+    objects = StockMovementManager()
     item = models.ForeignKey(Item, on_delete=models.PROTECT, related_name='movements')
     location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='location_movements')
     movement_type = models.ForeignKey(MovementType, on_delete=models.PROTECT)
@@ -611,6 +1111,32 @@ class StockMovement(TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     notes = models.TextField(blank=True)
     attachment = models.FileField(upload_to='movement_docs/', blank=True, null=True)
+    transfer_group = models.UUIDField(
+        null=True, blank=True, db_index=True,
+        help_text="Liga a saída e a entrada de uma mesma transferência entre locações"
+    )
+
+    class Meta:
+        indexes = [
+            # Saldo em data passada e extrato paginado por chave (created_at, id),
+            # no geral e por item/locação
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['item', 'created_at', 'id']),
+            models.Index(fields=['location', 'created_at', 'id']),
+        ]
+
+    @staticmethod
+    def effective_change_expression():
+        """
+        Equivalente em SQL de get_effective_change(), para agregações
+        feitas no banco (ex: Sum(StockMovement.effective_change_expression())).
+        """
+        return models.ExpressionWrapper(
+            models.F('quantity')
+            * Coalesce(models.F('movement_type__units_per_package'), 1)
+            * models.F('movement_type__factor'),
+            output_field=models.IntegerField()
+        )
 
     def get_effective_change(self):
         """
@@ -629,36 +1155,579 @@ class StockMovement(TimeStampedModel):
         base_quantity = self.quantity * (self.movement_type.units_per_package or 1)
         return base_quantity * self.unit_price
 
-    def save(self, *args, **kwargs):
-        if not self.pk: # Apenas na criação
-            price_to_check = self.item.purchase_price if self.movement_type.is_inbound else self.item.sale_price
+    def resolve_unit_price(self):
+        """
+        Retorna o preço unitário do movimento a partir do item: preço de
+        compra para entradas e de venda para saídas. As duas pernas de uma
+        transferência usam o custo médio da origem (definido em
+        build_transfer) ou, sem ele, o preço de compra: o estoque só muda de lugar.
+        Levanta ValidationError se o preço não for válido.
+        """
+        if self.transfer_group is not None and self.unit_price:
+            return self.unit_price
 
-            if price_to_check is None or price_to_check <= 0:
-                raise ValidationError(
-                    f"Não é possível criar o movimento. O item '{self.item.name}' "
-                    f"não possui um preço de {'compra' if self.movement_type.is_inbound else 'venda'} válido."
-                )
+        uses_purchase_price = self.movement_type.is_inbound or self.transfer_group is not None
+        price_to_check = self.item.purchase_price if uses_purchase_price else self.item.sale_price
+
+        if price_to_check is None or price_to_check <= 0:
+            raise ValidationError(
+                f"Não é possível criar o movimento. O item '{self.item.name}' "
+                f"não possui um preço de {'compra' if uses_purchase_price else 'venda'} válido."
+            )
+        return price_to_check
 
-            # Atribua o preço validado UMA VEZ. O bloco if/else foi removido.
-            self.unit_price = price_to_check
+    def save(self, *args, **kwargs):
+        if not self.pk: # Apenas na criação
+            # Atribua o preço validado UMA VEZ.
+            self.unit_price = self.resolve_unit_price()
 
         with transaction.atomic():
             is_new = self.pk is None
-            super().save(*args, **kwargs)
+            lean = is_new and settings.STOCK_LEAN_POSTING
+            if lean:
+                # O extrato não é editado e já guarda usuário e data: dispensa o HistoricalStockMovement
+                self.skip_history_when_saving = True
+            try:
+                super().save(*args, **kwargs)
+            finally:
+                if lean:
+                    del self.skip_history_when_saving
             if is_new:
-                stock_item, created = StockItem.objects.select_for_update().get_or_create(
-                    item=self.item, location=self.location
-                )
-                # Lógica de cálculo simplificada e sem repetição
-                stock_item.quantity += self.get_effective_change() 
-                stock_item.save()
+                # O movimento é gravado antes para que o saldo fique travado o mínimo possível
+                effective_change = self.get_effective_change()
+                received = max(effective_change, 0)
+                if not StockItem.apply_change(
+                    self.item_id, self.location_id, effective_change,
+                    received=received, received_value=received * self.unit_price
+                ):
+                    raise ValidationError(StockItem.insufficient_stock_message(
+                        self.item_id, self.location_id, -effective_change
+                    ))
+                Item.objects.add_stock_totals({self.item_id: effective_change})
+                StockMovementDailySummary.objects.add_movements([self])
+                if lean:
+                    ActivityFeedEntry.objects.add_movements([self])
 
     def __str__(self):
         op_signal = '+' if self.movement_type.is_inbound else '-'
         effective_qty = abs(self.get_effective_change())
         # ATUALIZE AQUI PARA USAR O CAMPO DO MIXIN
         return f"{self.item.name}: {op_signal}{effective_qty} em {self.created_at.strftime('%d/%m/%Y')}"
+
+class StockMovementDailySummaryManager(models.Manager):
+    @staticmethod
+    def _totals(movements):
+        """Agrupa as movimentações por (dia, item, locação, tipo de movimento)."""
+        from django.utils import timezone
+        totals = {}
+        for movement in movements:
+            key = (
+                timezone.localdate(movement.created_at), movement.item_id,
+                movement.location_id, movement.movement_type_id
+            )
+            effective_change = movement.get_effective_change()
+            total = totals.setdefault(key, {'quantity': 0, 'value': Decimal(0), 'movement_count': 0})
+            total['quantity'] += effective_change
+            # unit_price pode chegar como float quando atribuído diretamente
+            total['value'] += effective_change * Decimal(str(movement.unit_price))
+            total['movement_count'] += 1
+        return totals
+
+    def add_movements(self, movements):
+        """
+        Soma as movimentações recém-gravadas nos totais diários, na mesma
+        transação da gravação. Cada linha do resumo é atualizada uma vez por
+        chamada, sempre na mesma ordem de chaves. A chave inclui o par (item,
+        locação): só disputa a linha quem já disputa o mesmo StockItem, travado
+        antes pela gravação (custo medido com bench_stock_contention --mode all).
+        """
+        totals = self._totals(movements)
+        for key in sorted(totals, key=lambda key: tuple(str(part) for part in key)):
+            day, item_id, location_id, movement_type_id = key
+            total = totals[key]
+            lookup = {'day': day, 'item_id': item_id, 'location_id': location_id, 'movement_type_id': movement_type_id}
+            while True:
+                updated = self.filter(**lookup).update(
+                    quantity=models.F('quantity') + total['quantity'],
+                    value=models.F('value') + total['value'],
+                    movement_count=models.F('movement_count') + total['movement_count'],
+                )
+                if updated:
+                    break
+                try:
+                    with transaction.atomic():
+                        self.create(**lookup, **total)
+                    break
+                except IntegrityError:
+                    # Criada por uma transação concorrente: repete o UPDATE
+                    continue
+
+    def add_movements_in_bulk(self, movements):
+        """
+        Variante de add_movements para cargas grandes (ex: saldo de abertura):
+        lê as linhas afetadas com uma única consulta travada e grava com
+        bulk_update / bulk_create, em vez de um UPDATE por chave.
+        """
+        totals = self._totals(movements)
+        if not totals:
+            return
+        existing = self.select_for_update().filter(
+            day__in={key[0] for key in totals},
+            item_id__in={key[1] for key in totals},
+            location_id__in={key[2] for key in totals},
+            movement_type_id__in={key[3] for key in totals},
+        )
+        existing = {
+            (row.day, row.item_id, row.location_id, row.movement_type_id): row for row in existing
+        }
+
+        updated, created = [], []
+        for key, total in totals.items():
+            row = existing.get(key)
+            if row is None:
+                day, item_id, location_id, movement_type_id = key
+                created.append(self.model(
+                    day=day, item_id=item_id, location_id=location_id, movement_type_id=movement_type_id, **total
+                ))
+                continue
+            row.quantity += total['quantity']
+            row.value += total['value']
+            row.movement_count += total['movement_count']
+            updated.append(row)
+        self.bulk_update(updated, ['quantity', 'value', 'movement_count'], batch_size=1000)
+        self.bulk_create(created, batch_size=1000)
+
+class StockMovementDailySummary(models.Model):
+    """
+    Totais diários do extrato por (dia, item, locação, tipo de movimento),
+    mantidos na gravação de cada movimentação. Alimenta os gráficos de
+    entradas e saídas sem agrupar a tabela de movimentações.
+    Quantidade e valor têm o sinal do efeito no estoque (saídas negativas).
+    """
+    objects = StockMovementDailySummaryManager()
+    day = models.DateField(verbose_name="Dia")
+    item = models.ForeignKey(Item, on_delete=models.PROTECT, related_name='daily_summaries')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='daily_summaries')
+    movement_type = models.ForeignKey(MovementType, on_delete=models.PROTECT, related_name='daily_summaries')
+    quantity = models.IntegerField(default=0, verbose_name="Quantidade Efetiva")
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Valor")
+    movement_count = models.PositiveIntegerField(default=0, verbose_name="Movimentações")
+
+    class Meta:
+        unique_together = ('day', 'item', 'location', 'movement_type')
+        indexes = [
+            models.Index(fields=['day', 'location']),
+        ]
+        verbose_name = "Resumo Diário de Movimentações"
+        verbose_name_plural = "Resumos Diários de Movimentações"
+
+    @staticmethod
+    def value_expression():
+        """Valor efetivo (quantidade efetiva x preço unitário) de cada linha de um queryset de StockMovement."""
+        return models.ExpressionWrapper(
+            StockMovement.effective_change_expression() * models.F('unit_price'),
+            output_field=models.DecimalField(max_digits=16, decimal_places=2)
+        )
+
+    def __str__(self):
+        return f"{self.day:%d/%m/%Y} - {self.item_id} @ {self.location_id} ({self.movement_type_id}): {self.quantity}"
+
+class IdempotencyKeyManager(models.Manager):
+    def expiry_cutoff(self):
+        """Chaves criadas antes deste instante estão expiradas."""
+        from django.utils import timezone
+        return timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+
+    def live(self):
+        return self.filter(created_at__gte=self.expiry_cutoff())
+
+    def register(self, user, key, movement):
+        """
+        Grava a chave de uma movimentação recém-lançada. As chaves expiradas do
+        usuário (inclusive uma anterior com o mesmo valor) são removidas antes:
+        quem continua lançando não acumula chaves. As de usuários que pararam
+        de lançar ficam para purge (comando purge_idempotency_keys, agendado).
+        """
+        self.filter(user=user, created_at__lt=self.expiry_cutoff()).delete()
+        return self.create(user=user, key=key, movement=movement)
+
+    def purge(self):
+        """
+        Remove as chaves expiradas e, se ainda houver mais do que
+        IDEMPOTENCY_KEY_MAX_ENTRIES, as mais antigas. Retorna o total removido.
+        """
+        deleted, _ = self.filter(created_at__lt=self.expiry_cutoff()).delete()
+
+        max_entries = max(settings.IDEMPOTENCY_KEY_MAX_ENTRIES, 1)
+        oldest_kept = (
+            self.order_by('-created_at').values_list('created_at', flat=True)[max_entries - 1:max_entries].first()
+        )
+        if oldest_kept is not None:
+            overflow, _ = self.filter(created_at__lt=oldest_kept).delete()
+            deleted += overflow
+        return deleted
+
+class IdempotencyKey(models.Model):
+    """
+    Chave enviada pelo cliente no cabeçalho Idempotency-Key ao registrar uma
+    movimentação. Uma nova tentativa com a mesma chave devolve a movimentação
+    original em vez de lançá-la de novo.
+    """
+    objects = IdempotencyKeyManager()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    movement = models.ForeignKey(StockMovement, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+        verbose_name = "Chave de Idempotência"
+        verbose_name_plural = "Chaves de Idempotência"
+
+    def __str__(self):
+        return f"{self.user} - {self.key}"
     
+class StockClosingManager(models.Manager):
+    def latest_until(self, as_of):
+        """Retorna o fechamento mais recente com período até a data `as_of` (ou None)."""
+        return self.filter(period__lte=as_of).order_by('-period').first()
+
+    def balances_as_of(self, as_of, **filters):
+        """
+        Calcula os saldos por (item, locação) ao final do dia `as_of`.
+
+        Parte do fechamento mais próximo anterior à data e soma apenas as
+        movimentações posteriores a ele, em vez de reprocessar o extrato
+        inteiro. `filters` é aplicado tanto aos saldos de fechamento quanto
+        às movimentações (ex: item_id=..., location__branch_id=...).
+        Retorna uma tupla (fechamento usado ou None, {(item_id, location_id): quantidade}).
+        """
+        closing = self.latest_until(as_of)
+        balances = {}
+        movements = StockMovement.objects.filter(created_at__lt=day_start(as_of + timedelta(days=1)), **filters)
+
+        if closing is not None:
+            for item_id, location_id, quantity in closing.balances.filter(**filters).values_list(
+                'item_id', 'location_id', 'quantity'
+            ):
+                balances[(item_id, location_id)] = quantity
+            movements = movements.filter(created_at__gte=day_start(closing.period + timedelta(days=1)))
+
+        changes = (
+            movements.order_by()
+            .values('item_id', 'location_id')
+            .annotate(change=Sum(StockMovement.effective_change_expression()))
+        )
+        for row in changes:
+            key = (row['item_id'], row['location_id'])
+            balances[key] = balances.get(key, 0) + row['change']
+
+        return closing, balances
+
+class StockClosing(TimeStampedModel):
+    """
+    Fechamento mensal de estoque. Guarda (em StockClosingBalance) o saldo
+    de cada par (item, locação) ao final do período, para que consultas de
+    saldo em uma data passada não precisem reprocessar todo o extrato.
+    """
+    period = models.DateField(unique=True, verbose_name="Período (último dia do mês)")
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Fechado por"
+    )
+
+    objects = StockClosingManager()
+
+    class Meta:
+        ordering = ['-period']
+        verbose_name = "Fechamento de Estoque"
+        verbose_name_plural = "Fechamentos de Estoque"
+
+    def __str__(self):
+        return f"Fechamento {self.period.strftime('%m/%Y')}"
+
+class StockClosingBalance(models.Model):
+    """Saldo de um par (item, locação) em um fechamento. Saldos zerados não são gravados."""
+    closing = models.ForeignKey(StockClosing, on_delete=models.CASCADE, related_name='balances')
+    item = models.ForeignKey(Item, on_delete=models.PROTECT, related_name='closing_balances')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='closing_balances')
+    quantity = models.IntegerField()
+
+    class Meta:
+        unique_together = ('closing', 'item', 'location')
+        indexes = [
+            models.Index(fields=['closing', 'location']),
+        ]
+        verbose_name = "Saldo de Fechamento"
+        verbose_name_plural = "Saldos de Fechamento"
+
+    def __str__(self):
+        return f"{self.closing}: {self.item_id} @ {self.location_id} = {self.quantity}"
+
+class FullTextDocumentField(models.TextField):
+    """Documento do índice textual; aceita o lookup `match`."""
+
+@FullTextDocumentField.register_lookup
+class FullTextMatch(models.Lookup):
+    """
+    `document__match=<consulta>`: busca no índice textual de itens. A
+    consulta já vem na sintaxe do banco (ver inventory.search.build_query).
+    """
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        raise NotImplementedError("Busca textual disponível apenas em SQLite e PostgreSQL.")
+
+    def as_sqlite(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} @@ to_tsquery('simple', {rhs})", [*lhs_params, *rhs_params]
+
+class FullTextRank(models.Func):
+    """
+    Relevância de um item na busca textual (maior é mais relevante). No
+    SQLite usa a coluna oculta `rank` do FTS5 (bm25, onde menor é melhor);
+    no PostgreSQL, ts_rank sobre o tsvector.
+    """
+    output_field = models.FloatField()
+
+    def __init__(self, query, prefix='search_index__'):
+        super().__init__(
+            models.F(f'{prefix}document'), models.F(f'{prefix}rank'), models.Value(query)
+        )
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotImplementedError("Busca textual disponível apenas em SQLite e PostgreSQL.")
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        rank_sql, rank_params = compiler.compile(self.source_expressions[1])
+        return f"-{rank_sql}", rank_params
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        document, _, query = self.source_expressions
+        document_sql, document_params = compiler.compile(document)
+        query_sql, query_params = compiler.compile(query)
+        return (
+            f"ts_rank({document_sql}, to_tsquery('simple', {query_sql}))",
+            [*document_params, *query_params],
+        )
+
+class ItemSearchIndex(models.Model):
+    """
+    Índice de busca textual dos itens. A tabela não é gerida pelo Django: a
+    migração cria uma tabela virtual FTS5 no SQLite ou uma tabela com
+    tsvector e índice GIN no PostgreSQL, e inventory.search a mantém em dia.
+    Só serve para consultas a partir de Item (`search_index__document__match`).
+    """
+    item = models.OneToOneField(
+        Item, on_delete=models.DO_NOTHING, primary_key=True,
+        db_constraint=False, related_name='search_index'
+    )
+    # Texto normalizado (minúsculas, sem acentos) no SQLite; tsvector no PostgreSQL
+    document = FullTextDocumentField()
+    # Coluna oculta do FTS5 com a relevância (bm25) da consulta em andamento
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'inventory_item_search'
+        verbose_name = "Índice de Busca de Item"
+        verbose_name_plural = "Índice de Busca de Itens"
+
+class ItemImport(TimeStampedModel):
+    """
+    Importação de itens em lote a partir de um arquivo CSV ou XLSX (ver
+    inventory.imports.ItemImporter). O arquivo é processado em blocos, cada
+    um gravado na sua própria transação junto com o progresso: uma
+    importação interrompida continua do último bloco gravado.
+    """
+    class StatusChoices(models.TextChoices):
+        PENDING = 'PENDING', 'Pendente'
+        PROCESSING = 'PROCESSING', 'Em Processamento'
+        DONE = 'DONE', 'Concluída'
+        FAILED = 'FAILED', 'Falhou'
+
+    file = models.FileField(upload_to='item_imports/', verbose_name="Arquivo")
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Importado por"
+    )
+    default_branch = models.ForeignKey(
+        Branch, on_delete=models.PROTECT, null=True, blank=True,
+        verbose_name="Filial Padrão", help_text="Usada nas linhas sem a coluna branch"
+    )
+    status = models.CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.PENDING)
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name="Linhas Processadas")
+    created_count = models.PositiveIntegerField(default=0, verbose_name="Itens Criados")
+    # [{'row': número da linha no arquivo, 'sku': ..., 'errors': {campo: [mensagens]}}]
+    errors = models.JSONField(default=list, blank=True, verbose_name="Erros por Linha")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Importação de Itens"
+        verbose_name_plural = "Importações de Itens"
+
+    def __str__(self):
+        return f"Importação {self.file.name} ({self.get_status_display()})"
+
+class ActivityFeedEntryManager(models.Manager):
+    # Modelos cujo histórico aparece no feed de atividades do usuário
+    FEED_MODELS = (
+        'StockMovement', 'Item', 'Supplier', 'UserProfile', 'Branch',
+        'Category', 'CategoryGroup', 'Location', 'MovementType',
+    )
+
+    def in_feed(self, history_row):
+        return bool(history_row.history_user_id) and history_row.instance_type.__name__ in self.FEED_MODELS
+
+    def entry_for(self, history_row, item_name=None, movement_type_name=None):
+        """Monta (sem gravar) a entrada de um registro de histórico."""
+        model_name = history_row.instance_type.__name__
+        if model_name == 'UserProfile':
+            record_name = 'Seu Perfil'
+        elif model_name == 'StockMovement':
+            record_name = item_name
+        else:
+            record_name = history_row.name
+        return self.model(
+            user_id=history_row.history_user_id,
+            timestamp=history_row.history_date,
+            model_name=model_name,
+            history_type=history_row.history_type,
+            history_id=history_row.history_id,
+            record_id=str(history_row.id),
+            record_name=record_name or '',
+            item_name=item_name,
+            movement_type_name=movement_type_name,
+        )
+
+    def record(self, history_row, instance):
+        """
+        Grava a entrada de um registro de histórico recém-criado (signal
+        post_create_historical_record). Os nomes da movimentação vêm das
+        relações já carregadas na instância.
+        """
+        if not self.in_feed(history_row):
+            return None
+        names = {}
+        if isinstance(instance, StockMovement):
+            names = {'item_name': instance.item.name, 'movement_type_name': instance.movement_type.name}
+        entry = self.entry_for(history_row, **names)
+        entry.save(using=self.db)
+        return entry
+
+    @staticmethod
+    def _movement_names(movements):
+        """
+        Nomes de item e tipo de movimento (de movimentações ou dos seus
+        históricos): usa as relações já carregadas e busca as demais com uma
+        consulta para cada modelo.
+        """
+        names = []
+        for field_name, model in (('item', Item), ('movement_type', MovementType)):
+            found, missing = {}, set()
+            for movement in movements:
+                field = movement._meta.get_field(field_name)
+                pk = getattr(movement, field.attname)
+                if field.is_cached(movement):
+                    found[pk] = getattr(movement, field_name).name
+                else:
+                    missing.add(pk)
+            missing -= set(found)
+            if missing:
+                found.update(model.all_objects.filter(pk__in=missing).values_list('pk', 'name'))
+            names.append(found)
+        return names
+
+    def add_history(self, history_rows, batch_size=1000):
+        """
+        Grava em lote as entradas de registros de histórico já existentes,
+        ignorando os que já estão no feed. Os nomes de item e tipo das
+        movimentações são lidos com uma consulta por lote.
+        """
+        rows = [row for row in history_rows if self.in_feed(row)]
+        item_names, type_names = self._movement_names(
+            [row for row in rows if row.instance_type is StockMovement]
+        )
+        entries = [
+            self.entry_for(row, item_names.get(row.item_id), type_names.get(row.movement_type_id))
+            if row.instance_type is StockMovement else self.entry_for(row)
+            for row in rows
+        ]
+        return self.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+
+    def add_movements(self, movements, user=None, batch_size=1000):
+        """
+        Entradas de movimentações gravadas sem HistoricalStockMovement
+        (STOCK_LEAN_POSTING): a própria movimentação é o evento, e a entrada
+        fica sem history_id.
+        """
+        movements = [movement for movement in movements if movement.user_id or user]
+        item_names, type_names = self._movement_names(movements)
+        return self.bulk_create([
+            self.model(
+                user_id=movement.user_id or user.pk,
+                timestamp=movement.created_at,
+                model_name='StockMovement',
+                history_type='+',
+                record_id=str(movement.pk),
+                record_name=item_names.get(movement.item_id, ''),
+                item_name=item_names.get(movement.item_id),
+                movement_type_name=type_names.get(movement.movement_type_id),
+            )
+            for movement in movements
+        ], batch_size=batch_size)
+
+    def add_bulk_created(self, model, objs, chunk_size=500):
+        """
+        Entradas do histórico de criação gravado por bulk_create_with_history,
+        que não dispara o signal post_create_historical_record.
+        """
+        pks = [obj.pk for obj in objs]
+        for start in range(0, len(pks), chunk_size):
+            history = model.history.filter(
+                id__in=pks[start:start + chunk_size], history_type='+', history_user__isnull=False
+            )
+            self.add_history(history)
+
+class ActivityFeedEntry(models.Model):
+    """
+    Feed de atividades do usuário: uma linha por registro de histórico
+    (simple_history) dos modelos em ActivityFeedEntryManager.FEED_MODELS,
+    gravada junto com o histórico. Só recebe inserções; a página de
+    atividades lê direto do índice (user, timestamp) em vez de unir as
+    tabelas de histórico. `backfill_activity_feed` preenche o histórico antigo.
+    Com STOCK_LEAN_POSTING, as movimentações entram direto, sem histórico.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_feed', verbose_name="Usuário")
+    timestamp = models.DateTimeField(verbose_name="Data")
+    model_name = models.CharField(max_length=30, verbose_name="Modelo")
+    history_type = models.CharField(max_length=1, verbose_name="Tipo de Alteração")
+    # Vazio nas movimentações gravadas sem histórico (STOCK_LEAN_POSTING)
+    history_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Registro de Histórico")
+    # Chave do registro alterado (UUID ou inteiro, conforme o modelo)
+    record_id = models.CharField(max_length=64, verbose_name="Registro")
+    record_name = models.CharField(max_length=255, blank=True, verbose_name="Nome do Registro")
+    item_name = models.CharField(max_length=255, null=True, blank=True, verbose_name="Item")
+    movement_type_name = models.CharField(max_length=100, null=True, blank=True, verbose_name="Tipo de Movimento")
+
+    objects = ActivityFeedEntryManager()
+
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        unique_together = ('model_name', 'history_id')
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='activity_feed_user_time_idx'),
+        ]
+        verbose_name = "Atividade do Usuário"
+        verbose_name_plural = "Atividades dos Usuários"
+
+    def __str__(self):
+        return f"{self.user_id} {self.history_type} {self.model_name} {self.record_id}"
+
 class SystemSettings(SingletonModel):
     """
     Um modelo singleton para guardar configurações globais do sistema,
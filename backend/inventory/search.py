@@ -0,0 +1,191 @@
+# backend/inventory/search.py
+"""
+Busca textual de itens. O índice (tabela inventory_item_search, ver o
+modelo ItemSearchIndex) guarda um documento por item com SKU, nome, marca,
+códigos e descrições, e é consultado por um join a partir de Item:
+
+- SQLite: tabela virtual FTS5, com relevância pela coluna oculta `rank`;
+- PostgreSQL: coluna tsvector com índice GIN, relevância por ts_rank.
+
+Acentos e caixa são normalizados aqui, tanto no documento quanto na
+consulta, para que a busca se comporte igual nos dois bancos (sem depender
+da extensão unaccent do PostgreSQL). O índice é atualizado pelos signals de
+Item e pelas operações em lote que não disparam signals (importação de
+itens); `rebuild_item_search` o reconstrói do zero.
+"""
+import re
+import unicodedata
+
+from django.db import connections, router
+from rest_framework import filters
+
+from .models import FullTextRank, Item, ItemSearchIndex
+
+SUPPORTED_VENDORS = ('sqlite', 'postgresql')
+DOCUMENT_FIELDS = (
+    'sku', 'name', 'brand', 'ean', 'internal_code', 'manufacturer_code',
+    'short_description', 'long_description',
+)
+# Itens por comando no índice; mantém os parâmetros abaixo do limite do SQLite
+CHUNK_SIZE = 400
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """Minúsculas, sem acentos e com pontuação trocada por espaço."""
+    text = unicodedata.normalize('NFKD', str(text or '').lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _SEPARATORS.sub(' ', text).strip()
+
+
+def query_tokens(text):
+    return normalize(text).split()
+
+
+def build_query(tokens, vendor):
+    """
+    Consulta na sintaxe do banco em que todos os termos precisam aparecer,
+    cada um como prefixo ("parafu" encontra "parafuso").
+    """
+    if vendor == 'postgresql':
+        return ' & '.join(f'{token}:*' for token in tokens)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def item_document(values):
+    return ' '.join(filter(None, (normalize(value) for value in values)))
+
+
+def _connection():
+    connection = connections[router.db_for_write(ItemSearchIndex)]
+    return connection if connection.vendor in SUPPORTED_VENDORS else None
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start:start + CHUNK_SIZE]
+
+
+def _db_keys(pks, connection):
+    pk_field = Item._meta.pk
+    return [pk_field.get_db_prep_value(pk, connection) for pk in pks]
+
+
+def create_index_table(connection):
+    table = connection.ops.quote_name(ItemSearchIndex._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {table} USING fts5("
+                "item_id, document, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        elif connection.vendor == 'postgresql':
+            item_table = connection.ops.quote_name(Item._meta.db_table)
+            cursor.execute(
+                f"CREATE TABLE {table} ("
+                f"item_id uuid PRIMARY KEY REFERENCES {item_table} (id) "
+                "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX inventory_item_search_document_idx ON {table} USING GIN (document)"
+            )
+
+
+def drop_index_table(connection):
+    if connection.vendor in SUPPORTED_VENDORS:
+        table = connection.ops.quote_name(ItemSearchIndex._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def remove_items(pks, connection=None):
+    """Retira itens do índice."""
+    connection = connection or _connection()
+    if connection is None:
+        return
+    table = connection.ops.quote_name(ItemSearchIndex._meta.db_table)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(_db_keys(pks, connection)):
+            if connection.vendor == 'sqlite':
+                # Apagar pela própria busca usa o índice do FTS5 em vez de varrer a tabela
+                match = 'item_id:(' + ' OR '.join(f'"{key}"' for key in chunk) + ')'
+                cursor.execute(f"DELETE FROM {table} WHERE {table} MATCH %s", [match])
+            else:
+                cursor.execute(f"DELETE FROM {table} WHERE item_id = ANY(%s)", [chunk])
+
+
+def index_items(items, connection=None):
+    """
+    Grava (ou regrava) os documentos de `items` no índice. Aceita instâncias
+    de Item ou tuplas (pk, *DOCUMENT_FIELDS).
+    """
+    connection = connection or _connection()
+    if connection is None:
+        return
+    rows = []
+    for item in items:
+        if isinstance(item, Item):
+            item = (item.pk, *(getattr(item, field) for field in DOCUMENT_FIELDS))
+        rows.append((item[0], item_document(item[1:])))
+    table = connection.ops.quote_name(ItemSearchIndex._meta.db_table)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(rows):
+            keys = _db_keys((pk for pk, _ in chunk), connection)
+            params = [value for key, (_, document) in zip(keys, chunk) for value in (key, document)]
+            if connection.vendor == 'sqlite':
+                remove_items([pk for pk, _ in chunk], connection)
+                values = ', '.join(['(%s, %s)'] * len(chunk))
+                cursor.execute(f"INSERT INTO {table} (item_id, document) VALUES {values}", params)
+            else:
+                values = ', '.join(["(%s, to_tsvector('simple', %s))"] * len(chunk))
+                cursor.execute(
+                    f"INSERT INTO {table} (item_id, document) VALUES {values} "
+                    "ON CONFLICT (item_id) DO UPDATE SET document = EXCLUDED.document",
+                    params,
+                )
+
+
+def rebuild_index(chunk_size=2000):
+    """Esvazia o índice e indexa todos os itens, inclusive os excluídos. Retorna o total."""
+    connection = _connection()
+    if connection is None:
+        return 0
+    table = connection.ops.quote_name(ItemSearchIndex._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+    total = 0
+    rows = Item.all_objects.order_by().values_list('pk', *DOCUMENT_FIELDS)
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            index_items(batch, connection)
+            total += len(batch)
+            batch = []
+    index_items(batch, connection)
+    return total + len(batch)
+
+
+class ItemFullTextSearchFilter(filters.SearchFilter):
+    """
+    Substituto do SearchFilter para a lista de itens: `?search=` consulta o
+    índice textual e ordena pela relevância, a menos que `?ordering=` seja
+    informado. Em bancos sem suporte, cai no SearchFilter do DRF com os
+    `search_fields` da view.
+    """
+    def filter_queryset(self, request, queryset, view):
+        vendor = connections[queryset.db].vendor
+        if vendor not in SUPPORTED_VENDORS:
+            return super().filter_queryset(request, queryset, view)
+        tokens = query_tokens(request.query_params.get(self.search_param, ''))
+        if not tokens:
+            return queryset
+        query = build_query(tokens, vendor)
+        return (
+            queryset.filter(search_index__document__match=query)
+            .annotate(search_rank=FullTextRank(query))
+            .order_by('-search_rank', 'sku')
+        )
@@ -1,17 +1,71 @@
 # backend/inventory/serializers.py
 
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from django.db.models import F
 from django.contrib.auth.models import User, Group
 from django.core.exceptions import ValidationError
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator 
 from .models import (
     Branch, CategoryGroup, Sector, SystemSettings, UserProfile,
     Supplier, Category, Item, Location, 
-    StockItem, StockMovement, MovementType, validate_ean  
+    StockItem, StockMovement, MovementType, StockBatchError, ItemImport, ActivityFeedEntry, validate_ean
 )
 from .validators import validate_cnpj_format
 
 
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que procura o objeto primeiro em um dicionário
+    pré-carregado no contexto (`context['prefetched'][nome_do_campo]`).
+    Usado na validação de lotes para evitar uma query por linha.
+    """
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, ValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return prefetched[pk]
+
+
+def scope_to_user_branches(serializer, item_fields, location_fields, branch_fields=()):
+    """
+    Restringe os querysets dos campos de item, de locação e de filial às
+    filiais do usuário da requisição (administradores veem tudo).
+    """
+    # Se não houver um request no contexto, não faz nada (útil para o OpenAPI schema)
+    request = serializer.context.get('request', None)
+    if not request or not request.user:
+        return
+
+    user = request.user
+
+    # Se for admin, pode ver tudo. Senão, filtra pela filial.
+    if user.is_staff:
+        items, locations, branches = Item.objects.all(), Location.objects.all(), Branch.objects.all()
+    else:
+        try:
+            user_branches = user.profile.branches.all()
+            items = Item.objects.filter(branch__in=user_branches)
+            locations = Location.objects.filter(branch__in=user_branches)
+            branches = Branch.objects.filter(pk__in=user_branches)
+        except UserProfile.DoesNotExist:
+            # Se não tiver perfil, não pode ver nada
+            items, locations, branches = Item.objects.none(), Location.objects.none(), Branch.objects.none()
+
+    for name in item_fields:
+        serializer.fields[name].queryset = items
+    for name in location_fields:
+        serializer.fields[name].queryset = locations
+    for name in branch_fields:
+        serializer.fields[name].queryset = branches
+
+
 # --- Serializadores de Organização e Permissão ---
 
 class BranchSerializer(serializers.ModelSerializer):
@@ -442,12 +496,132 @@ class ItemCreateUpdateSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_by']
 
+class ItemImportSerializer(serializers.ModelSerializer):
+    """Envio de um arquivo de importação de itens e o relatório de erros por linha."""
+    created_by = serializers.StringRelatedField(read_only=True)
+    default_branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all(), required=False, allow_null=True)
+    error_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ItemImport
+        fields = [
+            'id', 'file', 'default_branch', 'status', 'processed_rows', 'created_count',
+            'error_count', 'errors', 'created_by', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['status', 'processed_rows', 'created_count', 'errors']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A filial padrão e as filiais das linhas ficam limitadas às do usuário
+        scope_to_user_branches(self, item_fields=[], location_fields=[], branch_fields=['default_branch'])
+
+    def get_error_count(self, obj):
+        return len(obj.errors)
+
+    def validate_file(self, value):
+        if not value.name.lower().endswith(('.csv', '.xlsx')):
+            raise serializers.ValidationError('Envie um arquivo .csv ou .xlsx.')
+        return value
+
+class ItemAsOfSerializer(serializers.ModelSerializer):
+    """Item como estava em uma data, reconstruído do histórico (Item.history)."""
+    history_date = serializers.DateTimeField(source='_history.history_date', read_only=True)
+    history_type = serializers.CharField(source='_history.history_type', read_only=True)
+    history_user = serializers.CharField(source='_history.history_user.username', default=None, read_only=True)
+
+    class Meta:
+        model = Item
+        fields = [
+            'id', 'sku', 'ean', 'name', 'status', 'brand', 'branch', 'category', 'supplier',
+            'purchase_price', 'sale_price', 'unit_of_measure', 'minimum_stock_level', 'deleted_at',
+            'history_date', 'history_type', 'history_user',
+        ]
+
+class ItemAsOfQuerySerializer(serializers.Serializer):
+    """Data da consulta (`?t=`), em ISO 8601."""
+    t = serializers.DateTimeField()
+
+class ItemPriceAsOfRequestSerializer(ItemAsOfQuerySerializer):
+    """Preços de vários itens em uma mesma data (conciliação de notas)."""
+    items = serializers.ListField(child=serializers.UUIDField(), min_length=1, max_length=500)
+
+class ItemPriceAsOfSerializer(serializers.ModelSerializer):
+    history_date = serializers.DateTimeField(source='_history.history_date', read_only=True)
+
+    class Meta:
+        model = Item
+        fields = ['id', 'sku', 'name', 'purchase_price', 'sale_price', 'history_date']
+
 class StockItemSerializer(serializers.ModelSerializer):
     location = LocationSerializer(read_only=True)
 
     class Meta:
         model = StockItem
-        fields = ['id', 'location', 'quantity', 'updated_at']
+        fields = ['id', 'location', 'quantity', 'average_cost', 'stock_value', 'updated_at']
+
+class ItemCodeResolveSerializer(serializers.ModelSerializer):
+    """Resposta compacta da leitura por scanner: o item encontrado e o saldo total."""
+    matched_field = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Item
+        fields = ['id', 'sku', 'ean', 'name', 'unit_of_measure', 'sale_price', 'status', 'total_quantity', 'matched_field']
+
+    def get_matched_field(self, obj):
+        return self.context.get('matched_field')
+
+class LowStockItemSerializer(serializers.ModelSerializer):
+    """Item abaixo do estoque mínimo, para a tela de reposição."""
+    branch_name = serializers.CharField(source='branch.name', read_only=True)
+    shortfall = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Item
+        fields = [
+            'id', 'sku', 'name', 'branch', 'branch_name',
+            'total_quantity', 'minimum_stock_level', 'shortfall'
+        ]
+
+    def get_shortfall(self, obj):
+        """Quantas unidades faltam para atingir o estoque mínimo."""
+        return obj.minimum_stock_level - obj.total_quantity
+
+class StockValuationGroupSerializer(serializers.Serializer):
+    """Quantidade e valor em estoque de um grupo (filial ou categoria)."""
+    name = serializers.CharField(allow_null=True)
+    quantity = serializers.IntegerField(source='total_quantity')
+    value = serializers.DecimalField(source='total_value', max_digits=16, decimal_places=2)
+
+class StockValuationBranchSerializer(StockValuationGroupSerializer):
+    id = serializers.UUIDField(source='branch_id')
+
+class StockValuationCategorySerializer(StockValuationGroupSerializer):
+    id = serializers.UUIDField(source='category_id', allow_null=True)
+
+class StockValuationSerializer(serializers.Serializer):
+    """Valorização do estoque pelo custo médio, totalizada por filial e por categoria."""
+    total_quantity = serializers.IntegerField()
+    total_value = serializers.DecimalField(max_digits=16, decimal_places=2)
+    branches = StockValuationBranchSerializer(many=True)
+    categories = StockValuationCategorySerializer(many=True)
+
+class MovementSummaryRowSerializer(serializers.Serializer):
+    """Totais de um dia para um tipo de movimento (quantidade e valor com o sinal do efeito no estoque)."""
+    day = serializers.DateField()
+    movement_type_id = serializers.UUIDField()
+    movement_type = serializers.CharField(source='movement_type_name')
+    quantity = serializers.IntegerField(source='total_quantity')
+    value = serializers.DecimalField(source='total_value', max_digits=16, decimal_places=2)
+    movement_count = serializers.IntegerField(source='total_count')
+
+class MovementSummarySerializer(serializers.Serializer):
+    """Resumo diário de entradas e saídas no período, lido dos totais diários."""
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    total_in = serializers.IntegerField()
+    total_out = serializers.IntegerField()
+    total_value = serializers.DecimalField(max_digits=16, decimal_places=2)
+    days = MovementSummaryRowSerializer(many=True)
 
 class StockMovementListSerializer(serializers.ModelSerializer):
     """Exibe uma representação detalhada e legível de uma movimentação de estoque."""
@@ -463,6 +637,54 @@ class StockMovementListSerializer(serializers.ModelSerializer):
             'total_moved_value', 'user', 'created_at', 'notes'
         ]
 
+class StockMovementFlatListSerializer(serializers.Serializer):
+    """
+    Mesma saída de StockMovementListSerializer, montada a partir das linhas de
+    flat_values(): uma única query com os JOINs necessários, sem instanciar
+    modelos nem chamar __str__ por linha. Usado na listagem do extrato.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Campos usados só para formatar valores (mesma saída do ModelSerializer)
+        self._unit_price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+        self._created_at_field = serializers.DateTimeField()
+
+    @staticmethod
+    def flat_values(queryset):
+        return queryset.values(
+            'id', 'quantity', 'unit_price', 'notes', 'created_at',
+            item_name=F('item__name'), item_sku=F('item__sku'),
+            location_name=F('location__name'), branch_name=F('location__branch__name'),
+            movement_type_code=F('movement_type__code'), movement_type_name=F('movement_type__name'),
+            units_per_package=F('movement_type__units_per_package'),
+            username=F('user__username'),
+        )
+
+    def to_representation(self, row):
+        # Mesmos formatos de Item.__str__, Location.__str__, MovementType.__str__
+        # e StockMovement.total_moved_value
+        return {
+            'id': row['id'],
+            'item': f"{row['item_name']} (SKU: {row['item_sku']})",
+            'location': f"{row['location_name']} ({row['branch_name']})",
+            'movement_type': f"{row['movement_type_code']} - {row['movement_type_name']}",
+            'quantity': row['quantity'],
+            'unit_price': self._unit_price_field.to_representation(row['unit_price']),
+            'total_moved_value': row['quantity'] * (row['units_per_package'] or 1) * row['unit_price'],
+            'user': row['username'],
+            'created_at': self._created_at_field.to_representation(row['created_at']),
+            'notes': row['notes'],
+        }
+
+class StockBalanceAsOfSerializer(serializers.Serializer):
+    """Saldo de um par (item, locação) em uma data passada."""
+    item = serializers.UUIDField()
+    item_sku = serializers.CharField()
+    item_name = serializers.CharField()
+    location = serializers.UUIDField()
+    location_name = serializers.CharField()
+    quantity = serializers.IntegerField()
+
 # --- Serializadores de Movimentação (TPOs e Movimentos) ---
 
 class MovementTypeSerializer(serializers.ModelSerializer):
@@ -522,17 +744,17 @@ class StockMovementSerializer(serializers.ModelSerializer):
     attachment = serializers.FileField(required=False, allow_null=True)
     # O queryset é definido como none() aqui porque será populado dinamicamente
     # no método __init__ com base nas permissões de filial do usuário.
-    item = serializers.PrimaryKeyRelatedField(queryset=Item.objects.none())
-    location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.none())
-    movement_type = serializers.PrimaryKeyRelatedField(queryset=MovementType.objects.all())
+    item = PrefetchedPrimaryKeyRelatedField(queryset=Item.objects.none())
+    location = PrefetchedPrimaryKeyRelatedField(queryset=Location.objects.none())
+    movement_type = PrefetchedPrimaryKeyRelatedField(queryset=MovementType.objects.all())
 
     class Meta:
         model = StockMovement
         fields = [
             'id', 'item', 'location', 'movement_type', 'quantity', 'notes',
-            'user', 'created_at', 'unit_price', 'total_moved_value', 'attachment'
+            'user', 'created_at', 'unit_price', 'total_moved_value', 'attachment', 'transfer_group'
         ]
-        read_only_fields = ['user', 'created_at', 'unit_price', 'total_moved_value']
+        read_only_fields = ['user', 'created_at', 'unit_price', 'total_moved_value', 'transfer_group']
 
     def __init__(self, *args, **kwargs):
         """
@@ -540,27 +762,7 @@ class StockMovementSerializer(serializers.ModelSerializer):
         do usuário que está fazendo a requisição.
         """
         super().__init__(*args, **kwargs)
-        
-        # Se não houver um request no contexto, não faz nada (útil para o OpenAPI schema)
-        request = self.context.get('request', None)
-        if not request or not request.user:
-            return
-
-        user = request.user
-        
-        # Se for admin, pode ver tudo. Senão, filtra pela filial.
-        if user.is_staff:
-            self.fields['item'].queryset = Item.objects.all()
-            self.fields['location'].queryset = Location.objects.all()
-        else:
-            try:
-                user_branches = user.profile.branches.all()
-                self.fields['item'].queryset = Item.objects.filter(branch__in=user_branches)
-                self.fields['location'].queryset = Location.objects.filter(branch__in=user_branches)
-            except UserProfile.DoesNotExist:
-                # Se não tiver perfil, não pode ver nada
-                self.fields['item'].queryset = Item.objects.none()
-                self.fields['location'].queryset = Location.objects.none()
+        scope_to_user_branches(self, item_fields=['item'], location_fields=['location'])
 
     def validate(self, data):
         """
@@ -569,74 +771,186 @@ class StockMovementSerializer(serializers.ModelSerializer):
         item = data['item']
         movement_type = data['movement_type']
         quantity = data['quantity']
-        
-        # ✅ ADICIONE A LÓGICA DE VALIDAÇÃO DE PREÇO AQUI ✅
-        price_to_check = item.purchase_price if movement_type.is_inbound else item.sale_price
-        if price_to_check is None or price_to_check <= 0:
-            price_type = 'compra' if movement_type.is_inbound else 'venda'
-            raise serializers.ValidationError(
-                f"Não é possível criar o movimento. O item '{item.name}' "
-                f"não possui um preço de {price_type} válido."
-            )
+
+        # Mesma regra de preço usada na gravação (sem consultas: item e tipo já carregados)
+        try:
+            StockMovement(item=item, movement_type=movement_type).resolve_unit_price()
+        except ValidationError as e:
+            raise serializers.ValidationError(e.messages)
 
         if quantity <= 0:
             raise serializers.ValidationError({"quantity": "A quantidade deve ser maior que zero."})
-        
-        if movement_type.factor < 0:
-            item = data['item']
-            location = data['location']
-            quantity_to_remove = quantity * (movement_type.units_per_package or 1)
-            stock_item = StockItem.objects.filter(item=item, location=location).first()
-            
-            if not stock_item or stock_item.quantity < quantity_to_remove:
-                current_stock = stock_item.quantity if stock_item else 0
-                raise serializers.ValidationError(
-                    f"Estoque insuficiente. Saldo atual: {current_stock}, Saída solicitada: {quantity_to_remove}"
-                )
+
+        # O saldo não é conferido aqui: a saída é validada e aplicada em um único
+        # UPDATE condicional na gravação (StockItem.apply_change), sem janela para
+        # duas saídas concorrentes passarem pela mesma conferência.
+        return data
+
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except ValidationError as e:
+            # Ex: "Estoque insuficiente" detectado ao aplicar a saída no saldo
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: e.messages})
+
+class StockMovementLineSerializer(StockMovementSerializer):
+    """Uma linha de um lote de movimentações (sem anexo)."""
+
+    class Meta(StockMovementSerializer.Meta):
+        fields = [
+            'id', 'item', 'location', 'movement_type', 'quantity', 'notes',
+            'user', 'created_at', 'unit_price', 'total_moved_value'
+        ]
+
+class StockTransferSerializer(serializers.Serializer):
+    """
+    Uma transferência de estoque entre duas locações, gravada como duas
+    movimentações (saída na origem e entrada no destino) na mesma transação.
+    """
+    item = PrefetchedPrimaryKeyRelatedField(queryset=Item.objects.none())
+    from_location = PrefetchedPrimaryKeyRelatedField(queryset=Location.objects.none())
+    to_location = PrefetchedPrimaryKeyRelatedField(queryset=Location.objects.none())
+    quantity = serializers.IntegerField(min_value=1)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        scope_to_user_branches(self, item_fields=['item'], location_fields=['from_location', 'to_location'])
+
+    def validate(self, data):
+        if data['from_location'] == data['to_location']:
+            raise serializers.ValidationError(
+                {"to_location": "A locação de destino deve ser diferente da locação de origem."}
+            )
         return data
-      
+
+    def create(self, validated_data):
+        try:
+            return StockMovement.objects.post_transfer(**validated_data)
+        except StockBatchError as e:
+            raise serializers.ValidationError(
+                [message for line in e.line_errors for message in line.get('non_field_errors', [])]
+            )
+        except ValidationError as e:
+            raise serializers.ValidationError(e.messages)
+
+class StockMovementBatchSerializer(serializers.Serializer):
+    """
+    Valida um lote de movimentações (ex: todas as linhas de uma nota fiscal)
+    e de transferências entre locações (ex: um palete inteiro mudando de
+    filial). Cada linha é validada individualmente e os erros são devolvidos
+    na mesma posição da linha enviada.
+    """
+    movements = serializers.ListField(
+        child=serializers.DictField(), required=False, max_length=1000
+    )
+    transfers = serializers.ListField(
+        child=serializers.DictField(), required=False, max_length=1000
+    )
+
+    def _prefetch(self, lines, serializer_class):
+        """Carrega os objetos relacionados do lote com uma query por campo."""
+        fields = serializer_class(context=self.context).fields
+        prefetched = {}
+        for name, field in fields.items():
+            if not isinstance(field, PrefetchedPrimaryKeyRelatedField):
+                continue
+            queryset = field.get_queryset()
+            pks = set()
+            for line in lines:
+                try:
+                    pks.add(queryset.model._meta.pk.to_python(line.get(name)))
+                except (TypeError, ValueError, ValidationError):
+                    pass
+            pks.discard(None)
+            prefetched[name] = queryset.in_bulk(pks)
+        return prefetched
+
+    def _validate_lines(self, lines, serializer_class):
+        context = {**self.context, 'prefetched': self._prefetch(lines, serializer_class)}
+        validated, errors = [], []
+        for line in lines:
+            serializer = serializer_class(data=line, context=context)
+            if serializer.is_valid():
+                validated.append(serializer.validated_data)
+                errors.append({})
+            else:
+                errors.append(serializer.errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def validate_movements(self, lines):
+        return self._validate_lines(lines, StockMovementLineSerializer)
+
+    def validate_transfers(self, lines):
+        return self._validate_lines(lines, StockTransferSerializer)
+
+    def validate(self, data):
+        if not data.get('movements') and not data.get('transfers'):
+            raise serializers.ValidationError("Envie ao menos uma movimentação ou transferência.")
+        return data
+
+    def create(self, validated_data):
+        user = validated_data.get('user')
+        movements = [StockMovement(**line) for line in validated_data.get('movements', [])]
+        transfers = validated_data.get('transfers', [])
+        try:
+            transfer_types = StockMovement.objects.transfer_types() if transfers else None
+        except ValidationError as e:
+            raise serializers.ValidationError({'transfers': e.messages})
+
+        line_count = len(movements)
+        for transfer in transfers:
+            movements.extend(StockMovement.objects.build_transfer(
+                user=user, transfer_types=transfer_types, **transfer
+            ))
+
+        try:
+            return StockMovement.objects.post_batch(movements, user=user)
+        except StockBatchError as e:
+            errors = {}
+            if line_count:
+                errors['movements'] = e.line_errors[:line_count]
+            if transfers:
+                # As duas pernas de cada transferência são reportadas juntas
+                leg_errors = e.line_errors[line_count:]
+                errors['transfers'] = [
+                    {'non_field_errors': [
+                        message for leg in leg_errors[index:index + 2]
+                        for message in leg.get('non_field_errors', [])
+                    ]} if any(leg_errors[index:index + 2]) else {}
+                    for index in range(0, len(leg_errors), 2)
+                ]
+            raise serializers.ValidationError(errors)
+
 class SystemSettingsSerializer(serializers.ModelSerializer):
     """Serializador para as Configurações do Sistema (Singleton)."""
     class Meta:
         model = SystemSettings
         fields = ['default_branch', 'default_sector']
 
-class ActivityLogSerializer(serializers.Serializer):
-    """Serializador definitivo para o log de atividades do usuário."""
-    # Estes são os campos que a view nos fornece a partir do .values()
-    # Eles são "write_only" porque só os usamos para CÁLCULO,
-    # não para serem exibidos diretamente na API.
-    history_id = serializers.IntegerField(write_only=True)
-    history_date = serializers.DateTimeField(write_only=True)
-    history_type = serializers.CharField(write_only=True)
-    history_user_id = serializers.IntegerField(write_only=True)
-    model_name = serializers.CharField(write_only=True)
-    record_name = serializers.CharField(write_only=True, allow_null=True)
-    item_name = serializers.CharField(required=False, write_only=True, allow_null=True)
-    movement_type_name = serializers.CharField(required=False, write_only=True, allow_null=True)
-    # O campo 'id' do objeto original, que pode ser UUID ou int. Lemos como string.
-    original_record_id = serializers.CharField(source='id', write_only=True, required=False, allow_null=True)
-    # O campo 'user_id' específico do UserProfile. Lemos como int.
-    user_profile_pk = serializers.IntegerField(source='user_id', write_only=True, required=False, allow_null=True)
-
-    # --- CAMPOS QUE REALMENTE APARECEM NA RESPOSTA DA API ---
-    # Estes são os campos que serão calculados e enviados para o frontend.
-    timestamp = serializers.DateTimeField(source='history_date', read_only=True)
+class ActivityLogSerializer(serializers.ModelSerializer):
+    """Serializador definitivo para o log de atividades do usuário (lido do ActivityFeedEntry)."""
     user = serializers.SerializerMethodField(read_only=True)
     action_type = serializers.SerializerMethodField(read_only=True)
     description = serializers.SerializerMethodField(read_only=True)
     target_url = serializers.SerializerMethodField(read_only=True)
 
+    class Meta:
+        model = ActivityFeedEntry
+        fields = ['timestamp', 'user', 'action_type', 'description', 'target_url']
+
     def get_description(self, obj):
         action_map = {'+': 'adicionou', '~': 'atualizou', '-': 'deletou'}
-        action_verb = action_map.get(obj['history_type'], 'modificou')
+        action_verb = action_map.get(obj.history_type, 'modificou')
         
-        model_type = obj['model_name']
-        record_name = obj.get('record_name')
+        model_type = obj.model_name
+        record_name = obj.record_name
 
         if model_type == 'StockMovement':
-            if obj['history_type'] == '+':
-                return f"Você realizou o movimento '{obj.get('movement_type_name')}' no item '{obj.get('item_name')}'."
+            if obj.history_type == '+':
+                return f"Você realizou o movimento '{obj.movement_type_name}' no item '{obj.item_name}'."
             return f"Você {action_verb} um registro de movimentação."
 
         if model_type == 'UserProfile':
@@ -652,32 +966,30 @@ class ActivityLogSerializer(serializers.Serializer):
 
     def get_user(self, obj):
         request = self.context.get('request')
-        if request and request.user.id == obj['history_user_id']:
+        if request and request.user.id == obj.user_id:
             full_name = request.user.get_full_name()
             return full_name if full_name else request.user.username
         return "Usuário Desconhecido"
 
     def get_action_type(self, obj):
-        model_name = obj['model_name']
         action_map = {'+': 'CREATED', '~': 'UPDATED', '-': 'DELETED'}
-        action = action_map.get(obj['history_type'], 'MODIFIED')
-        return f"{model_name}_{action}"
+        action = action_map.get(obj.history_type, 'MODIFIED')
+        return f"{obj.model_name}_{action}"
 
     def get_target_url(self, obj):
-        model_name = obj['model_name']
+        model_name = obj.model_name
         
         if model_name == 'UserProfile':
             return '/profile' # URL para UserProfile é estática
         
         # Para outros modelos, use o ID original do registro
-        record_id = obj.get('original_record_id')
+        record_id = obj.record_id
         if not record_id:
             return None
 
         url_map = {
             'Item': f'/inventory/{record_id}',
             'Branch': f'/settings/branches/{record_id}',
-            'UserProfile': '/profile', # URL para UserProfile é estática, não precisa do ID
             'Supplier': f'/suppliers/{record_id}',
         }
         return url_map.get(model_name)
\ No newline at end of file
@@ -1,9 +1,12 @@
 # inventory/signals.py
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile, SystemSettings
+from simple_history.signals import post_create_historical_record, pre_create_historical_record
+from . import search
+from .history import DeltaHistory, current_history_buffer
+from .models import ActivityFeedEntry, Item, UserProfile, SystemSettings
 
 @receiver(post_save, sender=User, dispatch_uid="create_user_profile")
 def create_or_update_user_profile(sender, instance, created, **kwargs):
@@ -33,4 +36,28 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
             # Log do erro mas não quebra a aplicação
             import logging
             logger = logging.getLogger(__name__)
-            logger.warning(f"Erro no signal de perfil: {e}")
\ No newline at end of file
+            logger.warning(f"Erro no signal de perfil: {e}")
+
+@receiver(post_save, sender=Item, dispatch_uid="index_item_search")
+def index_item_search(sender, instance, **kwargs):
+    """Mantém o índice de busca textual em dia a cada gravação do item."""
+    search.index_items([instance])
+
+@receiver(post_delete, sender=Item, dispatch_uid="remove_item_search")
+def remove_item_search(sender, instance, **kwargs):
+    search.remove_items([instance.pk])
+
+@receiver(post_create_historical_record, dispatch_uid="record_activity_feed")
+def record_activity_feed(sender, instance, history_instance, **kwargs):
+    """Grava a atividade do usuário no feed junto com o registro de histórico."""
+    ActivityFeedEntry.objects.record(history_instance, instance)
+
+@receiver(pre_create_historical_record, dispatch_uid="compact_delta_history")
+def compact_delta_history(sender, instance, history_instance, **kwargs):
+    """
+    Grava só os campos alterados nos modelos com histórico em delta. Dentro
+    de batched_history() a compactação é feita no flush do buffer.
+    """
+    delta = DeltaHistory.for_model(type(instance))
+    if delta is not None and current_history_buffer() is None:
+        delta.compact_against_database(history_instance)
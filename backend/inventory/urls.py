@@ -3,6 +3,10 @@ from .views import (
     BranchDetailView, BranchList, CategoryGroupDetailView, CategoryGroupList, CategoryList, FilterOptionsView, ItemDetailView, ItemListCreateView, CustomAuthToken, MovementTypeDetailView, MovementTypeList, SectorDetailView, SectorList, StockMovementCreate, 
     LocationList, StockMovementListView, SupplierList, SystemSettingsView, UserActivityLogView, UserDetailView, CurrentUserView, UserStatsView, logout_view, ItemStockDistributionView,
     SupplierDetailView, CategoryDetailView, LocationDetailView, country_list_view,
+    StockMovementBatchCreate, BranchStockView, StockTransferCreate, StockValuationView,
+    LowStockItemListView, MovementSummaryView, StockMovementExportView,
+    ItemCatalogExportView, ItemImportCreateView, ItemImportDetailView, ItemImportResumeView,
+    ItemResolveView, ItemAsOfView, ItemPriceAsOfView,
 )
 
 urlpatterns = [
@@ -18,11 +22,22 @@ urlpatterns = [
 
     # Rotas da Aplicação
     path("items/", ItemListCreateView.as_view(), name="item-list"),
+    path('items/export/', ItemCatalogExportView.as_view(), name='item-export'),
+    path('items/import/', ItemImportCreateView.as_view(), name='item-import'),
+    path('items/import/<int:pk>/', ItemImportDetailView.as_view(), name='item-import-detail'),
+    path('items/import/<int:pk>/resume/', ItemImportResumeView.as_view(), name='item-import-resume'),
+    path('items/resolve/<path:code>/', ItemResolveView.as_view(), name='item-resolve'),
+    path('items/low-stock/', LowStockItemListView.as_view(), name='item-low-stock'),
+    path('items/as-of/', ItemPriceAsOfView.as_view(), name='item-price-as-of'),
     path('items/<uuid:pk>/', ItemDetailView.as_view(), name='item-detail'),
     path('items/<uuid:pk>/stock/', ItemStockDistributionView.as_view(), name='item-stock-distribution'),
+    path('items/<uuid:pk>/as-of/', ItemAsOfView.as_view(), name='item-as-of'),
     
     path('movements/', StockMovementCreate.as_view(), name='stockmovement-create'),
+    path('movements/batch/', StockMovementBatchCreate.as_view(), name='stockmovement-batch-create'),
+    path('movements/transfer/', StockTransferCreate.as_view(), name='stockmovement-transfer-create'),
     path('movements/history/', StockMovementListView.as_view(), name='stockmovement-list'),
+    path('movements/export/', StockMovementExportView.as_view(), name='stockmovement-export'),
 
     path('movement-types/', MovementTypeList.as_view(), name='movementtype-list-create'),
     path('movement-types/<uuid:pk>/', MovementTypeDetailView.as_view(), name='movementtype-detail'),
@@ -42,6 +57,7 @@ urlpatterns = [
 
     path('branches/', BranchList.as_view(), name='branch-list'),
     path('branches/<uuid:pk>/', BranchDetailView.as_view(), name='branch-detail'),
+    path('branches/<uuid:pk>/stock/', BranchStockView.as_view(), name='branch-stock'),
 
     path('sectors/', SectorList.as_view(), name='sector-list'),
     path('sectors/<uuid:pk>/', SectorDetailView.as_view(), name='sector-detail'),
@@ -49,6 +65,9 @@ urlpatterns = [
     path('system-settings/', SystemSettingsView.as_view(), name='system-settings'),
 
     path('utils/countries/', country_list_view, name='country-list'),
+
+    path('reports/valuation/', StockValuationView.as_view(), name='report-valuation'),
+    path('reports/movement-summary/', MovementSummaryView.as_view(), name='report-movement-summary'),
     path('filter-options/', FilterOptionsView.as_view(), name='filter-options'),
 
 ]
@@ -2,9 +2,15 @@
 
 from PIL import Image as PilImage
 from io import BytesIO
+from datetime import datetime, time
 from django.core.files.base import ContentFile
+from django.utils import timezone
 import os
 
+def day_start(day):
+    """Primeiro instante de `day` no fuso do sistema (limite de filtros por dia em created_at)."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
 def optimize_image(image_field):
     """Redimensiona e converte uma imagem para WebP."""
     pil_image = PilImage.open(image_field)
@@ -1,16 +1,21 @@
 # backend/inventory/views.py
 
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_countries import countries
 from django.contrib.auth.models import User 
-from django.db.models import Count, Value, CharField, F, IntegerField
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Value, F, Q, Sum
+from django.db.models.functions import Coalesce
 from rest_framework import generics, filters, status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.throttling import UserRateThrottle
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from django.core.exceptions import ValidationError
-from rest_framework.exceptions import ValidationError as DRFValidationError
+from rest_framework.exceptions import NotFound, ValidationError as DRFValidationError
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
@@ -20,9 +25,16 @@ from django_filters.rest_framework import DjangoFilterBackend
 # Bloco de import unificado para modelos
 from .models import (
     Branch, Category, CategoryGroup, Sector, Location, Supplier, UserProfile,
-    Item, MovementType, StockMovement, StockItem, SystemSettings
+    Item, MovementType, StockMovement, StockItem, SystemSettings, StockClosing,
+    IdempotencyKey, StockMovementDailySummary, ItemImport, ActivityFeedEntry
 )
 
+from .exports import catalog_header, catalog_rows, export_lines
+from .history import DeltaHistory
+from .imports import ItemImporter
+from .search import ItemFullTextSearchFilter
+from .utils import day_start
+
 # Bloco de import unificado para serializadores
 from .serializers import (
     CategorySerializer, MovementTypeCreateUpdateSerializer, StockItemSerializer,
@@ -32,10 +44,17 @@ from .serializers import (
     ItemCreateUpdateSerializer, SupplierCreateUpdateSerializer, CategoryGroupSerializer,
     CategoryCreateUpdateSerializer, SystemSettingsSerializer, SectorCreateUpdateSerializer,
     StockMovementListSerializer, UserProfileUpdateSerializer, ActivityLogSerializer,
-    UserStatsSerializer
+    UserStatsSerializer, StockMovementBatchSerializer, StockBalanceAsOfSerializer,
+    StockTransferSerializer, StockValuationSerializer, LowStockItemSerializer,
+    StockMovementFlatListSerializer, MovementSummarySerializer, ItemImportSerializer,
+    ItemCodeResolveSerializer, ItemAsOfSerializer, ItemAsOfQuerySerializer, ItemPriceAsOfRequestSerializer,
+    ItemPriceAsOfSerializer
 )
 
 import logging
+import uuid
+from datetime import timedelta
+from decimal import Decimal
 logger = logging.getLogger(__name__)
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -43,6 +62,22 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class MovementHistoryCursorPagination(CursorPagination):
+    """
+    Paginação por cursor do extrato em ordem decrescente de (created_at, id):
+    filtra a partir da posição da página anterior em vez de usar OFFSET e não
+    executa COUNT(*). A ordem é fixa (`?ordering` é ignorado). Linhas com o
+    mesmo created_at são separadas pelo deslocamento guardado no cursor.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
 class BurstRateThrottle(UserRateThrottle):
     scope = 'burst'
 
@@ -306,7 +341,9 @@ class MovementTypeDetailView(BaseDetailView): # ✅ Garanta que herda de BaseDet
 class ItemListCreateView(BranchFilteredQuerysetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # `?search=` usa o índice de busca textual (ver inventory.search); os
+    # search_fields só valem em bancos sem suporte a ele
+    filter_backends = [DjangoFilterBackend, ItemFullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['sku', 'name', 'brand']
     branch_filter_field = 'branch__in' # Diz ao mixin qual campo filtrar
     filterset_fields = {
@@ -413,12 +450,62 @@ class ItemDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 class StockMovementCreate(generics.CreateAPIView):
-    """Endpoint para registrar uma nova movimentação de estoque."""
+    """
+    Endpoint para registrar uma nova movimentação de estoque.
+
+    Aceita o cabeçalho opcional Idempotency-Key: se o cliente repetir a
+    requisição com a mesma chave (ex: após perder a conexão), a resposta traz
+    a movimentação já registrada, sem lançá-la novamente no estoque.
+    """
     queryset = StockMovement.objects.all()
     serializer_class = StockMovementSerializer
     permission_classes = [IsAuthenticated]
     throttle_classes = [SustainedRateThrottle]
 
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response(
+                {'detail': 'O cabeçalho Idempotency-Key deve ter no máximo 255 caracteres.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        existing = self._find_idempotent_movement(key)
+        if existing is not None:
+            return self._replay(existing)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                self.perform_create(serializer)
+                # Uma requisição concorrente com a mesma chave falha aqui e desfaz o próprio lançamento
+                IdempotencyKey.objects.register(request.user, key, serializer.instance)
+        except IntegrityError:
+            existing = self._find_idempotent_movement(key)
+            if existing is None:
+                raise
+            return self._replay(existing)
+
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def _find_idempotent_movement(self, key):
+        record = (
+            IdempotencyKey.objects.live()
+            .filter(user=self.request.user, key=key)
+            .select_related('movement')
+            .first()
+        )
+        return record.movement if record else None
+
+    def _replay(self, movement):
+        response = Response(self.get_serializer(movement).data, status=status.HTTP_201_CREATED)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
     def perform_create(self, serializer):
         """
         Este método é chamado APENAS DEPOIS da validação passar.
@@ -426,6 +513,46 @@ class StockMovementCreate(generics.CreateAPIView):
         """
         serializer.save(user=self.request.user)
 
+class StockMovementBatchCreate(generics.GenericAPIView):
+    """
+    Endpoint para registrar um lote de movimentações (ex: todas as linhas
+    de uma nota fiscal) em uma única requisição e uma única transação.
+    O lote é gravado por inteiro ou não é gravado; em caso de erro a
+    resposta traz os erros de cada linha na posição correspondente.
+    """
+    serializer_class = StockMovementBatchSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [SustainedRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        movements = serializer.save(user=request.user)
+
+        read_serializer = StockMovementSerializer(movements, many=True, context={'request': request})
+        return Response({'movements': read_serializer.data}, status=status.HTTP_201_CREATED)
+
+class StockTransferCreate(generics.GenericAPIView):
+    """
+    Endpoint para transferir estoque entre locações (inclusive entre filiais).
+    A saída na origem e a entrada no destino são gravadas na mesma transação
+    e ligadas pelo mesmo transfer_group.
+    """
+    serializer_class = StockTransferSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [SustainedRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        legs = serializer.save(user=request.user)
+
+        read_serializer = StockMovementSerializer(legs, many=True, context={'request': request})
+        return Response(
+            {'transfer_group': legs[0].transfer_group, 'movements': read_serializer.data},
+            status=status.HTTP_201_CREATED
+        )
+
 class StockMovementListView(BaseListView): # Herda da nossa classe base para consistência
     """
     View para listar o histórico de movimentações de estoque (extrato).
@@ -437,7 +564,198 @@ class StockMovementListView(BaseListView): # Herda da nossa classe base para con
     serializer_class = StockMovementListSerializer
     # Habilita filtros poderosos para a nossa página de auditoria
     filterset_fields = ['movement_type', 'item', 'location', 'user']        
+
+    def list(self, request, *args, **kwargs):
+        """Lista a partir de values() (ver StockMovementFlatListSerializer)."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(StockMovementFlatListSerializer.flat_values(queryset))
+        serializer = StockMovementFlatListSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @property
+    def paginator(self):
+        """
+        `?pagination=cursor` (ou um `?cursor=` vindo dos links `next` /
+        `previous`) usa a paginação por cursor em (created_at, id), sem COUNT,
+        e ignora `?ordering`. Sem o parâmetro, a paginação por página continua.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            cursor_param = MovementHistoryCursorPagination.cursor_query_param
+            if params.get('pagination') == 'cursor' or cursor_param in params:
+                self._paginator = MovementHistoryCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
     
+class DateRangeMixin:
+    """Lê um período `?date_from=` / `?date_to=` (AAAA-MM-DD, dias completos no fuso do sistema)."""
+
+    def get_date(self, name, default=None):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        day = parse_date(value)
+        if day is None:
+            raise DRFValidationError({name: 'Data inválida. Use o formato AAAA-MM-DD.'})
+        return day
+
+    def get_date_range(self, default_from=None, default_to=None):
+        date_to = self.get_date('date_to', default_to)
+        date_from = self.get_date('date_from', default_from(date_to) if callable(default_from) else default_from)
+        if date_from and date_to and date_from > date_to:
+            raise DRFValidationError({'date_from': 'A data inicial deve ser anterior à data final.'})
+        return date_from, date_to
+
+class StreamingExportRenderer(BaseRenderer):
+    """
+    Renderers de exportação: só participam da negociação de `?format=`, já que
+    a view devolve o arquivo em um StreamingHttpResponse. As respostas de erro
+    saem pelo JSONRenderer (ver StreamingExportMixin.finalize_response).
+    """
+    charset = 'utf-8'
+
+class CSVExportRenderer(StreamingExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+class NDJSONExportRenderer(StreamingExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+class StreamingExportMixin:
+    """
+    Exportação em `?format=csv` (padrão) ou `?format=ndjson`. Os renderers
+    só participam da negociação; o arquivo é gerado linha a linha em um
+    StreamingHttpResponse (ver inventory.exports).
+    """
+    renderer_classes = [CSVExportRenderer, NDJSONExportRenderer]
+    export_filename = 'exportacao'
+    chunk_size = 2000
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if isinstance(response, Response):
+            # Erros (filtro ou data inválida, permissão) são JSON, com o
+            # Content-Type correspondente, e não um arquivo CSV/NDJSON
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+        return response
+
+    def streaming_export(self, header, rows):
+        renderer = self.request.accepted_renderer
+        response = StreamingHttpResponse(
+            export_lines(renderer.format, header, rows),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.export_filename}-{timezone.localdate():%Y%m%d}.{renderer.format}"'
+        )
+        return response
+
+class StockMovementExportView(StreamingExportMixin, DateRangeMixin, BranchFilteredQuerysetMixin, generics.GenericAPIView):
+    """
+    Exporta o extrato inteiro em CSV ou NDJSON, com os mesmos filtros do
+    histórico (movement_type, item, location, user) mais `?date_from=` /
+    `?date_to=`. As linhas são lidas com iterator() e enviadas à medida que
+    são geradas: a memória não depende do tamanho da exportação e o
+    cabeçalho sai antes da primeira consulta terminar.
+    """
+    queryset = StockMovement.objects.all()
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['movement_type', 'item', 'location', 'user']
+    branch_filter_field = 'location__branch__in'
+    export_filename = 'movimentacoes'
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        date_from, date_to = self.get_date_range()
+        if date_from:
+            queryset = queryset.filter(created_at__gte=day_start(date_from))
+        if date_to:
+            queryset = queryset.filter(created_at__lt=day_start(date_to + timedelta(days=1)))
+        rows = StockMovementFlatListSerializer.flat_values(queryset.order_by('-created_at', '-id'))
+        return self.streaming_export(StockMovementListSerializer.Meta.fields, self.serialized_rows(rows))
+
+    def serialized_rows(self, rows):
+        serializer = StockMovementFlatListSerializer()
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            yield serializer.to_representation(row)
+
+class ItemCatalogExportView(StreamingExportMixin, BranchFilteredQuerysetMixin, generics.GenericAPIView):
+    """
+    Exporta o catálogo de itens (SKU, EAN, preços, categoria, fornecedor)
+    com o saldo em cada filial, em CSV ou NDJSON. Aceita os filtros category,
+    supplier, branch e status. Usuários comuns veem apenas os itens e as
+    colunas de saldo das suas filiais.
+    """
+    queryset = Item.objects.filter(deleted_at__isnull=True)
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['category', 'supplier', 'branch', 'status']
+    branch_filter_field = 'branch__in'
+    export_filename = 'catalogo'
+
+    def get_branches(self):
+        user = self.request.user
+        branches = Branch.objects.order_by('name')
+        if user.is_staff or user.is_superuser:
+            return list(branches)
+        try:
+            return list(branches.filter(pk__in=user.profile.branches.all()))
+        except UserProfile.DoesNotExist:
+            return []
+
+    def get(self, request, *args, **kwargs):
+        branches = self.get_branches()
+        items = self.filter_queryset(self.get_queryset())
+        return self.streaming_export(
+            catalog_header(branches), catalog_rows(items, branches, chunk_size=self.chunk_size)
+        )
+
+class ItemImportMixin:
+    """Importações de itens visíveis ao usuário e execução limitada às suas filiais."""
+    serializer_class = ItemImportSerializer
+    permission_classes = [IsAuthenticated]
+    import_chunk_size = 1000
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_staff or user.is_superuser:
+            return ItemImport.objects.all()
+        return ItemImport.objects.filter(created_by=user)
+
+    def run_import(self, item_import):
+        # Mesmas filiais aceitas em `default_branch` (ver scope_to_user_branches)
+        branches = self.get_serializer().fields['default_branch'].queryset
+        return ItemImporter(item_import, chunk_size=self.import_chunk_size, branches=branches).run()
+
+class ItemImportCreateView(ItemImportMixin, generics.CreateAPIView):
+    """
+    Recebe um arquivo CSV ou XLSX de itens (multipart, campo `file`, e
+    opcionalmente `default_branch`) e o importa em blocos. A resposta traz
+    o relatório de erros por linha; as linhas válidas são gravadas mesmo
+    quando outras têm erro.
+    """
+
+    def perform_create(self, serializer):
+        item_import = serializer.save(created_by=self.request.user)
+        self.run_import(item_import)
+
+class ItemImportDetailView(ItemImportMixin, generics.RetrieveAPIView):
+    """Andamento e relatório de erros de uma importação de itens."""
+
+class ItemImportResumeView(ItemImportMixin, generics.GenericAPIView):
+    """Retoma uma importação interrompida a partir do último bloco gravado."""
+
+    def post(self, request, *args, **kwargs):
+        item_import = self.get_object()
+        if item_import.status == ItemImport.StatusChoices.DONE:
+            raise DRFValidationError({'status': 'Esta importação já foi concluída.'})
+        self.run_import(item_import)
+        return Response(self.get_serializer(item_import).data)
+
 class StockItemView(BranchFilteredQuerysetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = StockItemSerializer
     permission_classes = [IsAuthenticated]
@@ -524,10 +842,157 @@ class LocationDetailView(BaseDetailView):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
 
-class ItemStockDistributionView(generics.ListAPIView):
+class StockAsOfMixin:
+    """
+    Consulta de saldos em uma data passada (`?as_of=AAAA-MM-DD`), respondida
+    a partir do fechamento mensal mais próximo mais as movimentações seguintes.
+    """
+
+    def get_as_of(self, default=None):
+        value = self.request.query_params.get('as_of')
+        if not value:
+            return default
+        as_of = parse_date(value)
+        if as_of is None:
+            raise DRFValidationError({'as_of': 'Data inválida. Use o formato AAAA-MM-DD.'})
+        return as_of
+
+    def get_balances_as_of(self, as_of, **filters):
+        """Retorna (fechamento usado, linhas prontas para StockBalanceAsOfSerializer)."""
+        closing, balances = StockClosing.objects.balances_as_of(as_of, **filters)
+        items = Item.all_objects.only('sku', 'name').in_bulk({item_id for item_id, _ in balances})
+        locations = Location.all_objects.only('name').in_bulk({location_id for _, location_id in balances})
+
+        rows = [
+            {
+                'item': item_id, 'item_sku': items[item_id].sku, 'item_name': items[item_id].name,
+                'location': location_id, 'location_name': locations[location_id].name,
+                'quantity': quantity,
+            }
+            for (item_id, location_id), quantity in balances.items()
+            if quantity
+        ]
+        rows.sort(key=lambda row: (row['item_sku'], row['location_name']))
+        return closing, rows
+
+class LowStockCursorPagination(CursorPagination):
+    """Paginação por cursor na ordem do índice parcial de estoque baixo (SKU)."""
+    ordering = 'sku'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+class ItemResolveView(APIView):
+    """
+    Resolve um código lido por scanner (SKU, EAN, código interno ou do
+    fabricante, nessa prioridade) em um item, por busca exata indexada com
+    cache de leitura. Só encontra itens das filiais do usuário. Se mais de
+    um item tem o código no campo de maior prioridade, responde 409 com os
+    candidatos.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, code, *args, **kwargs):
+        matches = Item.objects.resolve_code(code)
+        items = Item.objects.filter(pk__in={item_id for _, item_id in matches})
+        user = request.user
+        if not (user.is_staff or user.is_superuser):
+            try:
+                items = items.filter(branch__in=user.profile.branches.all())
+            except UserProfile.DoesNotExist:
+                items = items.none()
+        items = {item.pk: item for item in items}
+
+        visible = [(field, items[item_id]) for field, item_id in matches if item_id in items]
+        if not visible:
+            raise NotFound('Nenhum item encontrado com este código.')
+        matched_field = visible[0][0]
+        candidates = [item for field, item in visible if field == matched_field]
+        if len(candidates) > 1:
+            return Response(
+                {
+                    'detail': 'Mais de um item tem este código.',
+                    'candidates': [{'id': item.pk, 'sku': item.sku, 'name': item.name} for item in candidates],
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        serializer = ItemCodeResolveSerializer(candidates[0], context={'matched_field': matched_field})
+        return Response(serializer.data)
+
+class LowStockItemListView(BranchFilteredQuerysetMixin, generics.ListAPIView):
+    """
+    Itens ativos abaixo do estoque mínimo (Item.is_low_stock), nas filiais do
+    usuário. Lê o indicador mantido pelo fluxo de estoque, sem agregar saldos.
+    """
+    serializer_class = LowStockItemSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = LowStockCursorPagination
+    branch_filter_field = 'branch__in'
+    queryset = Item.objects.low_stock().select_related('branch')
+
+class ItemAsOfView(BranchFilteredQuerysetMixin, generics.GenericAPIView):
+    """
+    Item como estava em uma data (`?t=` em ISO 8601), reconstruído do
+    histórico: o registro vigente é lido pelo índice (id, history_date) e os
+    campos em delta são preenchidos pelos registros anteriores.
+    """
+    permission_classes = [IsAuthenticated]
+    branch_filter_field = 'branch__in'
+    queryset = Item.all_objects.all()
+
+    def get(self, request, *args, **kwargs):
+        query = ItemAsOfQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        item = self.get_object()
+        record = DeltaHistory.for_model(Item).as_of(item.pk, query.validated_data['t'])
+        if record is None:
+            raise NotFound('O item não existia nesta data.')
+        return Response(ItemAsOfSerializer(record.instance).data)
+
+class ItemPriceAsOfView(BranchFilteredQuerysetMixin, generics.GenericAPIView):
+    """
+    Preços de uma lista de itens (até 500) em uma mesma data, para conciliar
+    notas fiscais, com uma consulta para o acesso e uma para o histórico.
+    Itens sem registro na data ou fora das filiais do usuário voltam em
+    `not_found`.
+    """
+    permission_classes = [IsAuthenticated]
+    branch_filter_field = 'branch__in'
+    queryset = Item.all_objects.all()
+
+    def post(self, request, *args, **kwargs):
+        serializer = ItemPriceAsOfRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        when = serializer.validated_data['t']
+        item_ids = list(dict.fromkeys(serializer.validated_data['items']))
+        visible = set(self.get_queryset().filter(pk__in=item_ids).values_list('pk', flat=True))
+
+        records = DeltaHistory.for_model(Item).as_of_many(visible, when)
+        results = [records[item_id].instance for item_id in item_ids if item_id in records]
+        not_found = [item_id for item_id in item_ids if item_id not in records]
+        return Response({
+            't': serializer.data['t'],
+            'results': ItemPriceAsOfSerializer(results, many=True).data,
+            'not_found': not_found,
+        })
+
+class ItemStockDistributionView(StockAsOfMixin, generics.ListAPIView):
     serializer_class = StockItemSerializer
     permission_classes = [IsAuthenticated]
 
+    def list(self, request, *args, **kwargs):
+        as_of = self.get_as_of()
+        if as_of is None:
+            return super().list(request, *args, **kwargs)
+
+        self.get_queryset()  # Valida o acesso ao item (404 se não permitido)
+        closing, rows = self.get_balances_as_of(as_of, item_id=self.kwargs.get("pk"))
+        return Response({
+            'as_of': as_of,
+            'closing_period': closing.period if closing else None,
+            'results': StockBalanceAsOfSerializer(rows, many=True).data,
+        })
+
     def get_queryset(self):
         user = self.request.user
         item_pk = self.kwargs.get("pk")
@@ -544,6 +1009,141 @@ class ItemStockDistributionView(generics.ListAPIView):
         # Caso contrário, retorna os estoques do item
         return StockItem.objects.filter(item__pk=item_pk).order_by("location__name")
 
+class BranchStockView(StockAsOfMixin, APIView):
+    """
+    Saldos de todos os itens de uma filial em uma data (`?as_of=AAAA-MM-DD`,
+    padrão: hoje), por item e locação. Usado em inventários e auditorias.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        branches = Branch.objects.all()
+        if not (user.is_staff or user.is_superuser):
+            try:
+                branches = user.profile.branches.all()
+            except UserProfile.DoesNotExist:
+                branches = Branch.objects.none()
+        if not branches.filter(pk=self.kwargs['pk']).exists():
+            raise Http404("Filial não encontrada ou sem permissão")
+
+        as_of = self.get_as_of(default=timezone.localdate())
+        closing, rows = self.get_balances_as_of(as_of, location__branch_id=self.kwargs['pk'])
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        response = paginator.get_paginated_response(StockBalanceAsOfSerializer(page, many=True).data)
+        response.data['as_of'] = as_of
+        response.data['closing_period'] = closing.period if closing else None
+        return response
+
+class StockValuationView(APIView):
+    """
+    Valor do estoque pelo custo médio ponderado (StockItem.average_cost),
+    totalizado por filial e por categoria. Lê apenas os saldos atuais, sem
+    percorrer o extrato. Aceita `?branch=<id>` para restringir a uma filial.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        stock_items = StockItem.objects.all()
+        if not (user.is_staff or user.is_superuser):
+            try:
+                stock_items = stock_items.filter(location__branch__in=user.profile.branches.all())
+            except UserProfile.DoesNotExist:
+                stock_items = stock_items.none()
+
+        branch_id = request.query_params.get('branch')
+        if branch_id:
+            try:
+                stock_items = stock_items.filter(location__branch_id=uuid.UUID(branch_id))
+            except ValueError:
+                raise DRFValidationError({'branch': 'Filial inválida.'})
+
+        totals = {
+            'total_quantity': Coalesce(Sum('quantity'), 0),
+            'total_value': Coalesce(Sum(StockItem.stock_value_expression()), Value(Decimal(0))),
+        }
+        grand_total = stock_items.aggregate(**totals)
+        branches = (
+            stock_items.values(branch_id=F('location__branch'), name=F('location__branch__name'))
+            .annotate(**totals).order_by('name')
+        )
+        categories = (
+            stock_items.values(category_id=F('item__category'), name=F('item__category__name'))
+            .annotate(**totals).order_by('name')
+        )
+
+        serializer = StockValuationSerializer(instance={
+            **grand_total,
+            'branches': branches,
+            'categories': categories,
+        })
+        return Response(serializer.data)
+
+class MovementSummaryView(DateRangeMixin, APIView):
+    """
+    Entradas e saídas por dia e tipo de movimento, para os gráficos do painel.
+    Lê apenas os totais diários (StockMovementDailySummary), sem agrupar o
+    extrato. Parâmetros: `?date_from=` e `?date_to=` (AAAA-MM-DD, padrão: os
+    últimos 30 dias), `?branch=<id>`, `?item=<id>` e `?movement_type=<id>`.
+    """
+    permission_classes = [IsAuthenticated]
+    default_days = 30
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        date_from, date_to = self.get_date_range(
+            default_from=lambda date_to: date_to - timedelta(days=self.default_days - 1),
+            default_to=timezone.localdate(),
+        )
+
+        summaries = StockMovementDailySummary.objects.filter(day__range=(date_from, date_to))
+        if not (user.is_staff or user.is_superuser):
+            try:
+                summaries = summaries.filter(location__branch__in=user.profile.branches.all())
+            except UserProfile.DoesNotExist:
+                summaries = summaries.none()
+
+        for param, lookup, label in (
+            ('branch', 'location__branch_id', 'Filial inválida.'),
+            ('item', 'item_id', 'Item inválido.'),
+            ('movement_type', 'movement_type_id', 'Tipo de movimento inválido.'),
+        ):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    summaries = summaries.filter(**{lookup: uuid.UUID(value)})
+                except ValueError:
+                    raise DRFValidationError({param: label})
+
+        totals = summaries.aggregate(
+            total_in=Coalesce(Sum('quantity', filter=Q(quantity__gt=0)), 0),
+            total_out=Coalesce(Sum('quantity', filter=Q(quantity__lt=0)), 0),
+            total_value=Coalesce(Sum('value'), Value(Decimal(0))),
+        )
+        days = (
+            summaries.values('day', 'movement_type_id', movement_type_name=F('movement_type__name'))
+            .annotate(
+                total_quantity=Sum('quantity'),
+                total_value=Sum('value'),
+                total_count=Sum('movement_count'),
+            )
+            .order_by('day', 'movement_type_name')
+        )
+
+        serializer = MovementSummarySerializer(instance={
+            'date_from': date_from,
+            'date_to': date_to,
+            'total_in': totals['total_in'],
+            'total_out': -totals['total_out'],
+            'total_value': totals['total_value'],
+            'days': days,
+        })
+        return Response(serializer.data)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated]) # Protegido por autenticação
 def country_list_view(request):
@@ -644,107 +1244,16 @@ class UserActivityLogView(APIView):
     pagination_class = StandardResultsSetPagination
 
     def get(self, request, *args, **kwargs):
-        user = self.request.user
-        user_id = user.id
-
-        common_fields = ['history_id', 'history_date', 'history_type', 'history_user_id', 'id']
-
-        # 1. StockMovement History
-        stock_movement_history = StockMovement.history.filter(history_user_id=user_id).annotate(
-            record_name=F('item__name'),
-            item_name=F('item__name'),  # Campo real
-            movement_type_name=F('movement_type__name'),  # Campo real
-            model_name=Value('StockMovement', output_field=CharField()),
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-
-        # 2. Item History
-        item_history = Item.history.filter(history_user_id=user_id).annotate(
-            record_name=F('name'),
-            item_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            movement_type_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            model_name=Value('Item', output_field=CharField()),
-            user_id=Value(None, output_field=IntegerField())
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-
-        # 3. Supplier History
-        supplier_history = Supplier.history.filter(history_user_id=user_id).annotate(
-            record_name=F('name'),
-            item_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            movement_type_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            model_name=Value('Supplier', output_field=CharField()),
-            user_id=Value(None, output_field=IntegerField())
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-        
-        # 4. UserProfile History
-        profile_history = UserProfile.history.filter(history_user_id=user_id).annotate(
-            record_name=Value('Seu Perfil'),
-            item_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            movement_type_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            model_name=Value('UserProfile', output_field=CharField())
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-
-        # 5. Branch History
-        branch_history = Branch.history.filter(history_user_id=user_id).annotate(
-            record_name=F('name'),
-            item_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            movement_type_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            model_name=Value('Branch', output_field=CharField()),
-            user_id=Value(None, output_field=IntegerField())
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-
-        # 6. Category History
-        category_history = Category.history.filter(history_user_id=user_id).annotate(
-            record_name=F('name'),
-            item_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            movement_type_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            model_name=Value('Category', output_field=CharField()),
-            user_id=Value(None, output_field=IntegerField())
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-
-        # 7. CategoryGroup History
-        category_group_history = CategoryGroup.history.filter(history_user_id=user_id).annotate(
-            record_name=F('name'),
-            item_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            movement_type_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            model_name=Value('CategoryGroup', output_field=CharField()),
-            user_id=Value(None, output_field=IntegerField())
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-
-        # 8. Location History
-        location_history = Location.history.filter(history_user_id=user_id).annotate(
-            record_name=F('name'),
-            item_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            movement_type_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            model_name=Value('Location', output_field=CharField()),
-            user_id=Value(None, output_field=IntegerField())
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-
-        # 9. MovementType History
-        movement_type_history = MovementType.history.filter(history_user_id=user_id).annotate(
-            record_name=F('name'),
-            item_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            movement_type_name=Value(None, output_field=CharField()),  # <-- CORREÇÃO
-            model_name=Value('MovementType', output_field=CharField()),
-            user_id=Value(None, output_field=IntegerField())
-        ).values(*common_fields, 'record_name', 'item_name', 'movement_type_name', 'model_name', 'user_id').order_by()
-
-        # Une todos os querysets
-        queryset = stock_movement_history.union(
-            item_history, supplier_history, profile_history, branch_history,
-            category_history, category_group_history, location_history, movement_type_history,
-            all=True
-        )
-        
-        all_results = list(queryset)
-        all_results.sort(key=lambda x: x['history_date'], reverse=True)
+        # Uma página do feed pelo índice (user, timestamp), sem unir as tabelas de histórico
+        queryset = ActivityFeedEntry.objects.filter(user=request.user).order_by('-timestamp', '-id')
 
         paginator = self.pagination_class()
-        page = paginator.paginate_queryset(all_results, request, view=self)
+        page = paginator.paginate_queryset(queryset, request, view=self)
 
         if page is not None:
             serializer = ActivityLogSerializer(page, many=True, context={'request': request})
             return paginator.get_paginated_response(serializer.data)
 
-        serializer = ActivityLogSerializer(all_results, many=True, context={'request': request})
+        serializer = ActivityLogSerializer(queryset, many=True, context={'request': request})
         return Response(serializer.data)
     
\ No newline at end of file